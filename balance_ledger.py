@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+
+import config
+import sqla_db
+
+logger = logging.getLogger("discord.ledger")
+
+
+class BalanceLedger:
+    """
+    Write-behind cache for gambling balances.
+
+    Balance changes are applied to the cached balances right away and queued, the queue is written to the database in
+    one transaction every flush_interval seconds, or as soon as max_pending changes are queued.
+    All balance changes need to go through the ledger, otherwise the cached balances get out of date.
+    """
+
+    def __init__(self, flush_interval: float, max_pending: int, max_cached: int = 1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_cached = max_cached
+
+        self.balances: dict[int, sqla_db.Balance] = {}
+        self.pending: dict[int, tuple[int, int]] = {}  # user id -> (amount, bet) not written yet
+
+        # stats
+        self.queue_depth = 0  # changes queued since the last flush
+        self.last_flush_latency: float | None = None
+        self.flush_count = 0
+
+        self.write_lock = asyncio.Lock()
+        self.flush_requested = asyncio.Event()
+        self.flush_task: asyncio.Task | None = None
+
+    def start(self):
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_loop())
+
+    async def stop(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+
+        await self.flush()
+
+    async def flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_requested.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+
+            self.flush_requested.clear()
+
+            try:
+                await self.flush()
+            except Exception as error:
+                logger.error("error while writing balances, keeping them queued", exc_info=error)
+
+    async def flush(self):
+        async with self.write_lock:
+            if len(self.pending) == 0:
+                return
+
+            pending, self.pending = self.pending, {}
+            queue_depth, self.queue_depth = self.queue_depth, 0
+
+            start_time = time.perf_counter()
+            try:
+                async with sqla_db.Session() as db:
+                    await db.apply_balance_changes(pending)
+            except BaseException:
+                # requeue everything, changes made during the failed flush are already queued again
+                for user_id, (amount, bet) in pending.items():
+                    self.queue_change(user_id, amount, bet)
+                self.queue_depth += queue_depth - len(pending)
+                raise
+
+            self.last_flush_latency = time.perf_counter() - start_time
+            self.flush_count += 1
+            logger.debug(f"wrote {queue_depth} balance changes for {len(pending)} users "
+                         f"in {self.last_flush_latency * 1000:.1f} ms")
+
+            if len(self.balances) > self.max_cached:
+                self.balances = {user_id: balance for user_id, balance in self.balances.items()
+                                 if user_id in self.pending}
+
+    def queue_change(self, user_id: int, amount: int, bet: int):
+        queued_amount, queued_bet = self.pending.get(user_id, (0, 0))
+        self.pending[user_id] = (queued_amount + amount, queued_bet + bet)
+        self.queue_depth += 1
+
+        if self.queue_depth >= self.max_pending:
+            self.flush_requested.set()
+
+    async def get_balance(self, user_id: int) -> sqla_db.Balance:
+        while user_id not in self.balances:
+            flush_count = self.flush_count
+            async with sqla_db.Session(read_only=True) as db:
+                balance = await db.get_balance(user_id)
+
+            # a flush during the read might have written and evicted changes made in the meantime, the read balance
+            # could predate them, so it is read again
+            if self.flush_count != flush_count:
+                continue
+
+            # another call might have loaded the balance in the meantime
+            self.balances.setdefault(user_id, balance)
+
+        return self.balances[user_id]
+
+    async def change_balance(self, user_id: int, amount: int, bet: int = 0) -> sqla_db.Balance | None:
+        """Adds amount to the balance and bet to the total bets, returns None if the balance can't cover the bet"""
+        balance = await self.get_balance(user_id)
+
+        # balances can be negative after staff changes, plain additions don't need to be covered
+        if bet > 0 and balance.balance < bet:
+            return None
+
+        balance.balance += amount
+        balance.total_bets += bet
+        self.queue_change(user_id, amount, bet)
+
+        return balance
+
+    async def add_balance(self, user_id: int, amount: int) -> sqla_db.Balance:
+        return await self.change_balance(user_id, amount)
+
+    async def update_balance(self, user_id: int, won: bool, bet: int, bet_winnings: int) -> sqla_db.Balance | None:
+        """Settles a bet, returns None if the balance can no longer cover the bet"""
+        return await self.change_balance(user_id, bet_winnings - bet if won else -bet, bet=bet)
+
+    async def reset_gambler(self, user_id: int) -> sqla_db.Balance:
+        async with self.write_lock:
+            # queued changes are overwritten by the reset, bets placed while it is written are checked against it
+            pending = self.pending.pop(user_id, None)
+            balance = sqla_db.Balance(discord_id=user_id, balance=0, total_bets=0)
+            self.balances[user_id] = balance
+
+            try:
+                async with sqla_db.Session() as db:
+                    await db.reset_gambler(user_id)
+            except BaseException:
+                # the stored balance is read again, with the overwritten changes queued again
+                self.balances.pop(user_id, None)
+                if pending is not None:
+                    self.queue_change(user_id, *pending)
+                raise
+
+        return balance
+
+    async def get_leaderboard(self, limit: int = 10) -> tuple[list[sqla_db.Balance], list[sqla_db.Balance]]:
+        await self.flush()
+
+        async with sqla_db.Session(read_only=True) as db:
+            return await db.get_leaderboard(limit=limit)
+
+
+ledger = BalanceLedger(
+    flush_interval=config.balance_flush_interval_ms / 1000,
+    max_pending=config.balance_flush_max_ops,
+)
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tests")]
+
+# config is read when it is imported, benchmarks never touch the database of the bot
+os.environ["DB_PATH"] = os.environ.get("BENCHMARK_DB_PATH") or os.path.join(tempfile.mkdtemp(), "map_art.db")
+os.environ.setdefault("TOKEN", "benchmark")
+os.environ.setdefault("BLACKLIST", "[]")
+
+import sqla_db
+from archive_maps import make_maps
+
+
+async def fill_archive(count: int):
+    """Creates the schema and adds count synthetic maps, see tests/archive_maps.py"""
+    await sqla_db.create_schema()
+
+    async with sqla_db.Session() as db:
+        await db.add_maps(make_maps(count))
+
+
+async def best_of(repeats: int, function: Callable[[], Awaitable]) -> tuple[float, object]:
+    """Fastest of repeats runs in seconds, and the result of the last run"""
+    best = float("inf")
+    result = None
+
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = await function()
+        best = min(best, time.perf_counter() - start_time)
+
+    return best, result
+
+
+def run(coroutine: Awaitable):
+    """Runs the benchmark and closes the connections of the database before the event loop is closed"""
+    async def run_and_dispose():
+        try:
+            return await coroutine
+        finally:
+            await sqla_db.Session.engine.dispose()
+            await sqla_db.Session.reader_engine.dispose()
+
+    return asyncio.run(run_and_dispose())
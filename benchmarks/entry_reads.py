@@ -0,0 +1,105 @@
+"""Reading entries through ENTRY_COLUMNS compared to loading ORM objects with selectin artists
+
+python benchmarks/entry_reads.py --maps 100000 --rows 10000
+"""
+import argparse
+import datetime
+import itertools
+
+from sqlalchemy import select
+
+from common import best_of, fill_archive, run
+
+import sqla_db
+from cogs import search
+from map_archive_entry import MapArtArchiveEntry
+from sqla_db import MapArtArchiveDBEntry
+
+QUERIES = ["", "-f", "t:flat"]
+
+
+def entry_from_db_entry(db_entry: MapArtArchiveDBEntry) -> MapArtArchiveEntry:
+    """How entries were built from ORM objects before ENTRY_COLUMNS"""
+    return MapArtArchiveEntry(
+        map_id=db_entry.map_id,
+        width=db_entry.width,
+        height=db_entry.height,
+        map_type=db_entry.type,
+        palette=db_entry.palette,
+        name=db_entry.name,
+        artists=[artist.name for artist in db_entry.artists],
+        notes=db_entry.notes,
+        image_url=db_entry.image_url,
+        create_date=db_entry.create_date.replace(tzinfo=datetime.UTC),
+        author_id=db_entry.author_id,
+        message_id=db_entry.message_id,
+        flagged=db_entry.flagged,
+    )
+
+
+async def orm_execute(search_query: search.SearchArguments, rows: int) -> list[MapArtArchiveEntry]:
+    async with sqla_db.Session(read_only=True) as db:
+        query_builder = db.get_query_builder()
+        search.build_query(search_query, query_builder)
+
+        db_entries = (await db.session.execute(query_builder.query.limit(rows))).scalars().all()
+        return [entry_from_db_entry(db_entry) for db_entry in db_entries]
+
+
+async def core_execute(search_query: search.SearchArguments, rows: int) -> list[MapArtArchiveEntry]:
+    async with sqla_db.Session(read_only=True) as db:
+        query_builder = db.get_query_builder()
+        search.build_query(search_query, query_builder)
+
+        return await query_builder.execute(limit=rows)
+
+
+async def orm_load_maps(map_ids: list[int]) -> list[MapArtArchiveEntry]:
+    async with sqla_db.Session(read_only=True) as db:
+        entries = {}
+        for batch in itertools.batched(map_ids, sqla_db.ADD_MAPS_BATCH_SIZE):
+            query = select(MapArtArchiveDBEntry).where(MapArtArchiveDBEntry.map_id.in_(batch))
+            entries |= {db_entry.map_id: entry_from_db_entry(db_entry)
+                        for db_entry in (await db.session.execute(query)).scalars()}
+
+        return [entries[map_id] for map_id in map_ids if map_id in entries]
+
+
+async def core_load_maps(map_ids: list[int]) -> list[MapArtArchiveEntry]:
+    async with sqla_db.Session(read_only=True) as db:
+        return await sqla_db.load_maps(db.session, map_ids)
+
+
+def report(label: str, orm: tuple[float, list], core: tuple[float, list]):
+    # both ways have to read the same entries, otherwise the timings aren't comparable
+    same = "same entries" if orm[1] == core[1] else "ENTRIES DIFFER"
+    print(f"{label:>16}: ORM {orm[0] * 1000:7.1f} ms  ENTRY_COLUMNS {core[0] * 1000:7.1f} ms  "
+          f"({len(core[1])} entries, {same})")
+
+
+async def benchmark(maps: int, rows: int, repeats: int):
+    await fill_archive(maps)
+    converter = search.SearchArgumentConverter(default_min_size=0, default_order_by="date")
+
+    for argument in QUERIES:
+        search_query = await converter.convert(None, argument)
+        report(f"execute {argument!r}", await best_of(repeats, lambda: orm_execute(search_query, rows)),
+               await best_of(repeats, lambda: core_execute(search_query, rows)))
+
+    map_ids = list(range(1, min(rows, maps) + 1))
+    report(f"load_maps {len(map_ids)}", await best_of(repeats, lambda: orm_load_maps(map_ids)),
+           await best_of(repeats, lambda: core_load_maps(map_ids)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--maps", type=int, default=100000)
+    parser.add_argument("--rows", type=int, default=10000, help="number of entries read per run")
+    parser.add_argument("--repeats", type=int, default=3, help="the fastest run is printed")
+    args = parser.parse_args()
+
+    run(benchmark(args.maps, args.rows, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
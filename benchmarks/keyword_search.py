@@ -0,0 +1,74 @@
+"""Keyword searches through the full-text index compared to the LIKE filters it replaced
+
+python benchmarks/keyword_search.py --maps 100000
+"""
+import argparse
+
+from sqlalchemy import not_, or_, select
+
+from common import best_of, fill_archive, run
+
+import sqla_db
+from cogs import search
+from sqla_db import MapArtArchiveDBEntry, MapArtArtist, artist_mapart
+
+QUERIES = ["miku", "miku castle", "-miku -sunset", '"colour suppressed"']
+
+
+class LikeQueryBuilder(sqla_db.MapArtQueryBuilder):
+    """Matches keywords with LIKE on the map table and an artist semi-join, like searches did before map_art_fts"""
+    def add_search_filter(self, include=None, exclude=None):
+        def search_term_matches(search_term: str):
+            return or_(
+                MapArtArchiveDBEntry.name.contains(search_term),
+                MapArtArchiveDBEntry.map_id.in_(
+                    select(artist_mapart.c.map_id).join(MapArtArtist).where(MapArtArtist.name.ilike(search_term))),
+                MapArtArchiveDBEntry.palette.ilike(search_term),
+                MapArtArchiveDBEntry.type.ilike(search_term),
+                MapArtArchiveDBEntry.message_id == search_term,
+                MapArtArchiveDBEntry.notes.contains(search_term),
+            )
+
+        for search_term in include or []:
+            self.query = self.query.where(search_term_matches(search_term))
+
+        for search_term in exclude or []:
+            self.query = self.query.where(not_(search_term_matches(search_term)))
+
+
+async def first_page(builder_class: type[sqla_db.MapArtQueryBuilder], search_query: search.SearchArguments) -> int:
+    """What search_entries reads for the first page of a search that isn't cached"""
+    async with sqla_db.Session(read_only=True) as db:
+        query_builder = builder_class(db.session)
+        search.build_query(search_query, query_builder)
+
+        total = await query_builder.count()
+        await query_builder.execute(limit=10)
+
+    return total
+
+
+async def benchmark(maps: int, repeats: int):
+    await fill_archive(maps)
+    converter = search.SearchArgumentConverter(default_min_size=0, default_order_by="date")
+
+    for argument in QUERIES:
+        search_query = await converter.convert(None, argument)
+        like_time, like_total = await best_of(repeats, lambda: first_page(LikeQueryBuilder, search_query))
+        fts_time, fts_total = await best_of(repeats, lambda: first_page(sqla_db.MapArtQueryBuilder, search_query))
+
+        print(f"{argument:>22}: LIKE {like_time * 1000:7.1f} ms ({like_total} maps)  "
+              f"FTS {fts_time * 1000:7.1f} ms ({fts_total} maps)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--maps", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=3, help="the fastest run is printed")
+    args = parser.parse_args()
+
+    run(benchmark(args.maps, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Parsing search arguments with MixedArgsConverter compared to the parser it replaced
+
+python benchmarks/search_arguments.py
+"""
+import argparse
+import time
+
+import common  # sets up the import path and the configuration of the bot
+
+from cogs.search import MixedArgsConverter
+from test_search_arguments import reference_convert
+
+ARGUMENTS = {
+    "typical": 'miku a:"Some One" -t:flat pal:full order:size',
+    "200 message links": " ".join(f"https://discord.com/channels/1/2/{10 ** 17 + i}" for i in range(200)),
+    "2,000 words": " ".join(f"word{i}" for i in range(2000)),
+    "20,000 words": " ".join(f"word{i}" for i in range(20000)),
+}
+
+
+def per_call(function, argument: str, seconds: float) -> float:
+    """Average seconds per call, calls are repeated for at least the given time"""
+    calls = 0
+    start_time = time.perf_counter()
+
+    while (elapsed := time.perf_counter() - start_time) < seconds:
+        function(argument)
+        calls += 1
+
+    return elapsed / calls
+
+
+def benchmark(seconds: float):
+    converter = MixedArgsConverter()
+
+    # convert doesn't await anything, so it can be driven without an event loop
+    def convert(argument: str):
+        try:
+            converter.convert(None, argument).send(None)
+        except StopIteration as stop:
+            return stop.value
+
+    for label, argument in ARGUMENTS.items():
+        assert convert(argument) == reference_convert(argument)
+
+        print(f"{label:>18}: previous {per_call(reference_convert, argument, seconds) * 10 ** 6:9.1f} us  "
+              f"MixedArgsConverter {per_call(convert, argument, seconds) * 10 ** 6:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1, help="time spent on every parser and argument")
+    args = parser.parse_args()
+
+    benchmark(args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Searches and gambles per second with each storage profile, searches are run in SQLite without the cache
+
+python benchmarks/storage_profiles.py --maps 20000 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import fill_archive, run
+
+import sqla_db
+from cogs import search
+
+QUERIES = ["miku", "castle dragon", "artist:Artist3", "type:flat", "size:2x2", "ocean order:size", ""]
+
+
+async def searcher(rng: random.Random, deadline: float) -> int:
+    converter = search.SearchArgumentConverter(default_min_size=0, default_order_by="date")
+    searches = 0
+
+    while time.perf_counter() < deadline:
+        search_query = await converter.convert(None, rng.choice(QUERIES))
+        await search.search_entries(search_query)
+        searches += 1
+
+    return searches
+
+
+async def gambler(rng: random.Random, deadline: float) -> int:
+    converter = search.SearchArgumentConverter(default_min_size=0, default_order_by="date")
+    gambles = 0
+
+    while time.perf_counter() < deadline:
+        search_query = await converter.convert(None, rng.choice(QUERIES))
+        async with sqla_db.Session(read_only=True) as db:
+            random_map = await db.get_random_map()
+        count, match = await search.search_count_and_match(search_query, random_map.map_id)
+
+        # every bet is its own write, like a ledger flushing after each gamble
+        async with sqla_db.Session() as db:
+            await db.apply_balance_changes({rng.randint(1, 50): (count if match else -1, 1)})
+        gambles += 1
+
+    return gambles
+
+
+async def workload(seconds: float, workers: int):
+    deadline = time.perf_counter() + seconds
+    searches = [searcher(random.Random(i), deadline) for i in range(workers)]
+    gambles = [gambler(random.Random(-i - 1), deadline) for i in range(workers)]
+
+    results = await asyncio.gather(*searches, *gambles)
+    print(f"{sqla_db.config.storage_profile:>8}: {sum(results[:workers]) / seconds:8.1f} searches/s "
+          f"{sum(results[workers:]) / seconds:8.1f} gambles/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--maps", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=4, help="number of searchers and of gamblers")
+    parser.add_argument("--profiles", nargs="+", default=list(sqla_db.STORAGE_PROFILES))
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(workload(args.seconds, args.workers))
+        return
+
+    # the archive is created once with sqlite's defaults, every profile runs on its own copy in a fresh process
+    directory = tempfile.mkdtemp()
+    seed_path = os.path.join(directory, "seed.db")
+    env = os.environ | {"SEARCH_INDEX": "0", "SEARCH_CACHE_SIZE": "0"}
+
+    subprocess.run([sys.executable, "-c", f"from common import fill_archive, run; run(fill_archive({args.maps}))"],
+                   env=env | {"BENCHMARK_DB_PATH": seed_path, "STORAGE_PROFILE": "default"},
+                   cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+    for profile in args.profiles:
+        profile_path = os.path.join(directory, f"{profile}.db")
+        shutil.copyfile(seed_path, profile_path)
+
+        subprocess.run([sys.executable, __file__, "--run", "--seconds", str(args.seconds), "--workers", str(args.workers)],
+                       env=env | {"BENCHMARK_DB_PATH": profile_path, "STORAGE_PROFILE": profile}, check=True)
+
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
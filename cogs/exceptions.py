@@ -17,6 +17,8 @@ class CommandErrorHandler(commands.Cog):
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx: commands.Context, error: Exception):
+        if isinstance(error, commands.HybridCommandError):
+            error = getattr(error.original, 'original', error.original)  # errors of slash commands
         if isinstance(error, commands.CommandInvokeError):
             error = getattr(error, 'original', error)
 
@@ -5,7 +5,9 @@ import discord
 from discord.ext import commands
 
 from cogs import map_archive, checks
-from cogs.search import SearchArgumentConverter, SearchArguments, build_query
+from cogs.search import SearchArgumentConverter, SearchArguments, search_count, search_count_and_match, search_options, \
+    add_search_options
+from balance_ledger import ledger
 import sqla_db
 
 
@@ -34,13 +36,18 @@ class GambleCommands(commands.Cog, name="Gambling"):
     def __init__(self, bot: discord.Client):
         self.bot = bot
 
+    async def cog_load(self):
+        ledger.start()
+
+    async def cog_unload(self):
+        await ledger.stop()
+
     @checks.is_staff_or_owner()
     @commands.command(hidden=True)
     async def add_balance(self, ctx: commands.Context, user: discord.User, amount: int):
         """Add to balance"""
-        
-        async with sqla_db.Session() as db:
-            balance = await db.add_balance(user.id, amount)
+
+        balance = await ledger.add_balance(user.id, amount)
 
         await ctx.reply(f"{user.name}'s balance is now {balance.balance} doubloons")
 
@@ -49,11 +56,19 @@ class GambleCommands(commands.Cog, name="Gambling"):
     async def reset_balance(self, ctx: commands.Context, user: discord.User | None = None):
         """Reset a user"""
 
-        async with sqla_db.Session() as db:
-            balance = await db.reset_gambler(user.id)
+        balance = await ledger.reset_gambler(user.id)
 
         await ctx.reply(f"{user.name}'s balance is now {balance.balance} doubloons")
 
+    @checks.is_staff_or_owner()
+    @commands.command(hidden=True)
+    async def ledger_stats(self, ctx: commands.Context):
+        """Show the state of the balance write queue"""
+        last_flush = f"{ledger.last_flush_latency * 1000:.1f} ms" if ledger.last_flush_latency is not None else "never"
+
+        await ctx.reply(f"{ledger.queue_depth} queued changes for {len(ledger.pending)} users, "
+                        f"{len(ledger.balances)} cached balances, {ledger.flush_count} flushes, last flush: {last_flush}")
+
     @checks.is_in_bot_channel()
     @commands.command(aliases=["bal"])
     async def balance(self, ctx: commands.Context, user: discord.User | None = None):
@@ -61,9 +76,8 @@ class GambleCommands(commands.Cog, name="Gambling"):
 
         if user is None:
             user = ctx.author
-        
-        async with sqla_db.Session() as db:
-            balance = await db.get_balance(user.id)
+
+        balance = await ledger.get_balance(user.id)
 
         if user.id == ctx.author.id:
             await ctx.reply(f"Your balance is {balance_str(balance)} and you have bet a total of {total_bets_str(balance)}")
@@ -71,8 +85,10 @@ class GambleCommands(commands.Cog, name="Gambling"):
             await ctx.reply(f"{user.name}'s balance is {balance_str(balance)} and they have bet a total of {total_bets_str(balance)}")
 
     @checks.is_in_bot_channel()
-    @commands.command()
-    async def odds(self, ctx: commands.Context, bet: int | None = 100, *, search_args: Annotated[SearchArguments, SearchArgumentConverter(default_min_size=0, default_order_by="date")]):
+    @commands.hybrid_command()
+    @search_options
+    async def odds(self, ctx: commands.Context, bet: int | None = 100, *, search_args: Annotated[SearchArguments, SearchArgumentConverter(default_min_size=0, default_order_by="date")] = None,
+                   artist: str | None = None, map_type: str | None = None, palette: str | None = None):
         """Check the odds of a search
 
         Usage: !!odds [bet] search_args
@@ -87,13 +103,12 @@ class GambleCommands(commands.Cog, name="Gambling"):
 
         if bet is None:
             bet = 100
+        search_args = await add_search_options(ctx, search_args, artist, map_type, palette, required=True)
 
-        async with sqla_db.Session() as db:
-            query_builder = db.get_query_builder()
+        win_count = await search_count(search_args, fill_cache=True)
 
-            build_query(search_args, query_builder)
-
-            total_count, win_count, _, _ = await db.roll_gamble(query_builder.query)
+        async with sqla_db.Session(read_only=True) as db:
+            total_count = await db.get_map_count()
 
         if win_count == 0:
             raise commands.BadArgument("can't bet on a search with no results")
@@ -112,8 +127,7 @@ class GambleCommands(commands.Cog, name="Gambling"):
         is_booster = any(role.is_premium_subscriber() for role in ctx.author.roles)
         reward = 250 if is_booster else 200
 
-        async with sqla_db.Session() as db:
-            balance = await db.add_balance(ctx.author.id, reward)
+        balance = await ledger.add_balance(ctx.author.id, reward)
 
         claim_msg = f"{reward} doubloons claimed"
 
@@ -125,9 +139,10 @@ class GambleCommands(commands.Cog, name="Gambling"):
         await ctx.reply(claim_msg)
 
     @checks.is_in_bot_channel()
-    @commands.command(aliases=["bet", "gamba"])
-    @commands.max_concurrency(1, per=commands.BucketType.user, wait=True)
-    async def gamble(self, ctx: commands.Context, bet: int, *, search_args: Annotated[SearchArguments, SearchArgumentConverter(default_min_size=0, default_order_by="date")]):
+    @commands.hybrid_command(aliases=["bet", "gamba"])
+    @search_options
+    async def gamble(self, ctx: commands.Context, bet: int, *, search_args: Annotated[SearchArguments, SearchArgumentConverter(default_min_size=0, default_order_by="date")] = None,
+                     artist: str | None = None, map_type: str | None = None, palette: str | None = None):
         """Gamble some money on a random map in the archive
 
         Usage: !!gamble bet search_args
@@ -143,18 +158,19 @@ class GambleCommands(commands.Cog, name="Gambling"):
         if bet <= 0:
             raise commands.BadArgument("can't bet less than 1 doubloon")
 
-        async with sqla_db.Session() as db:
-            balance = await db.get_balance(ctx.author.id)
+        search_args = await add_search_options(ctx, search_args, artist, map_type, palette, required=True)
+
+        balance = await ledger.get_balance(ctx.author.id)
 
         if bet > balance.balance:
             raise commands.BadArgument("can't bet more than balance")
         
-        async with sqla_db.Session() as db:
-            query_builder = db.get_query_builder()
+        async with sqla_db.Session(read_only=True) as db:
+            total_count = await db.get_map_count()
+            roll = await db.get_random_map()
 
-            build_query(search_args, query_builder)
-
-            total_count, win_count, won, roll = await db.roll_gamble(query_builder.query)
+        # the search is evaluated once for both the odds and the win
+        win_count, won = await search_count_and_match(search_args, roll.map_id)
 
         if win_count == 0:
             raise commands.BadArgument("can't bet on a search with no results")
@@ -166,8 +182,11 @@ class GambleCommands(commands.Cog, name="Gambling"):
         else:
             bet_winnings = 0
 
-        async with sqla_db.Session() as db:
-            balance = await db.update_balance(ctx.author.id, won, bet, bet_winnings)
+        balance = await ledger.update_balance(ctx.author.id, won, bet, bet_winnings)
+
+        # the balance check above can be outdated by other bets placed in the meantime
+        if balance is None:
+            raise commands.BadArgument("can't bet more than balance")
 
         message = f"You {"won" if won else "lost"}, your new balance is {balance_str(balance)}!"
 
@@ -187,8 +206,7 @@ class GambleCommands(commands.Cog, name="Gambling"):
 
             return f"**{ranks.get(rank, f'{rank}:')} {user_name}** - {balance_str(entry)}, {total_bets_str(entry)} bet in total\n"
 
-        async with sqla_db.Session() as db:
-            top_bals, top_bets = await db.get_leaderboard(limit=5)
+        top_bals, top_bets = await ledger.get_leaderboard(limit=5)
 
         message = "# Richest Gamblers:\n"
 
@@ -1,6 +1,5 @@
 import datetime
 import logging
-import math
 import traceback
 from typing import Optional, Callable, Annotated
 
@@ -13,7 +12,8 @@ import config
 import sqla_db
 from ai import MapArtLLMOutput
 from cogs import checks
-from cogs.search import SearchArguments, SearchArgumentConverter, SearchResults, search_entries
+from cogs.search import SearchArguments, SearchArgumentConverter, SearchResults, search_entries, search_cache, \
+    search_flights, search_help, search_options, add_search_options, search_count, search_exists
 from cogs.views import MapEntityEditorView
 from map_archive_entry import MapArtArchiveEntry
 
@@ -51,23 +51,23 @@ async def format_entry_list(ctx: commands.Context, search_results: SearchResults
                             line_formatter: Callable[[int, MapArtArchiveEntry], str] = lambda _,
                                                                                               entry: entry.line,
                             page_size: int = 10) -> str:
-    max_page = math.ceil(len(search_results.results) / page_size)
-
-    page_entries = search_results.results[(search_results.page - 1) * page_size:search_results.page * page_size]
+    max_page = search_results.max_page(page_size)
 
     message = f"# {title}:\n"
 
-    lines = [line_formatter(i, entry) for (i, entry) in enumerate(page_entries)]
+    lines = [line_formatter(i, entry) for (i, entry) in enumerate(search_results.results)]
     message += "\n".join(lines)
 
-    page_info = f"Page {search_results.page}/{max_page}, {len(search_results.results)} {'results' if len(search_results.results) != 1 else 'result'}"
+    page_info = f"Page {search_results.page}/{max_page}, {search_results.total} {'results' if search_results.total != 1 else 'result'}"
     command_help = ""
 
     filters_joined = (' ' + ' '.join(search_results.non_page_args)) if search_results.non_page_args else ""
     if search_results.page < max_page:
-        command_help = f" - use_ `{ctx.clean_prefix}{ctx.invoked_with} {search_results.page + 1}{filters_joined}` _to see next page"
+        cursor = f" after:{search_results.next_cursor}"
+        command_help = f" - use_ `{ctx.clean_prefix}{ctx.invoked_with} {search_results.page + 1}{cursor}{filters_joined}` _to see next page"
     elif search_results.page > 1:  # only show previous page hint if not on first page
-        command_help = f" - use_ `{ctx.clean_prefix}{ctx.invoked_with} {search_results.page - 1}{filters_joined}` _to see previous page"
+        cursor = f" before:{search_results.previous_cursor}"
+        command_help = f" - use_ `{ctx.clean_prefix}{ctx.invoked_with} {search_results.page - 1}{cursor}{filters_joined}` _to see previous page"
 
     message += f"\n\n-# _{page_info}{command_help}_"
     return message
@@ -83,11 +83,16 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
     async def cog_load(self) -> None:
         await sqla_db.create_schema()
 
+        if config.search_index:
+            await sqla_db.archive_index.load()
+
         if not config.dev_mode:
             self.update_archive.start()
+            self.maintain_archive.start()
 
     def cog_unload(self):
         self.update_archive.cancel()
+        self.maintain_archive.cancel()
 
     async def fix_attributes(self, entry: MapArtLLMOutput, message: discord.Message = None) -> Optional[
         MapArtArchiveEntry]:
@@ -119,7 +124,7 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
     @tasks.loop(minutes=90)
     async def update_archive(self):
         try:
-            async with sqla_db.Session() as db:
+            async with sqla_db.Session(read_only=True) as db:
                 fetch_from_timestamp = await db.get_latest_create_date()
 
             if fetch_from_timestamp is not None:
@@ -161,6 +166,29 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
     async def before_updating_archive(self):
         await self.bot.wait_until_ready()
 
+    @tasks.loop(hours=24)
+    async def maintain_archive(self):
+        try:
+            async with sqla_db.Session() as db:
+                removed_artists = await db.run_maintenance()
+
+            logger.info(f"archive maintenance removed {removed_artists} orphan artists")
+            if not config.dev_mode:
+                await self.bot_log_channel.send(
+                    f"archive maintenance: removed {removed_artists} orphan artists, updated query planner statistics")
+
+        except BaseException as error:
+            logger.error("error during archive maintenance", exc_info=error)
+            if not config.dev_mode:
+                tb = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+                message = f"An error occurred during archive maintenance:\n```py\n{tb}\n```"
+
+                await self.bot_log_channel.send(message)
+
+    @maintain_archive.before_loop
+    async def before_maintaining_archive(self):
+        await self.bot.wait_until_ready()
+
     async def get_entry_message_content(self, entry: MapArtArchiveEntry) -> str:
         return (await self.archive_channel.fetch_message(entry.message_id)).clean_content
 
@@ -168,12 +196,13 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
     @commands.command(aliases=["e", "ea", "editall"], hidden=True, rest_is_raw=True)
     async def edit(self, ctx: commands.Context, *, search_args: Annotated[
         SearchArguments, SearchArgumentConverter(default_min_size=0, default_order_by="date")]):
-        search_results = await search_entries(search_args)
-        results = search_results.results[(search_results.page - 1) * 10:]
-
-        if len(results) == 0:
+        if not await search_exists(search_args):
             await ctx.reply("no results for this search")
             return
+
+        search_results = await search_entries(search_args, all_following=ctx.invoked_with in ("ea", "editall"))
+        results = search_results.results
+
         if ctx.invoked_with in ("e", "edit"):
             # normal edit semantics
             if len(results) > 1:
@@ -234,16 +263,19 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
     @commands.command(hidden=True)
     async def reimport_map(self, ctx, *, search_args: Annotated[
         SearchArguments, SearchArgumentConverter(default_min_size=0, default_order_by="date")]):
-        search_results = (await search_entries(search_args)).results
+        # checked before any map is loaded, the limit applies to the whole search
+        result_count = await search_count(search_args)
 
-        if len(search_results) >= 100:
+        if result_count >= 100:
             await ctx.reply("too many results for this search, limit is 100")
             return
 
-        if len(search_results) == 0:
+        if result_count == 0:
             await ctx.reply("no results for this search")
             return
 
+        search_results = (await search_entries(search_args, all_following=True)).results
+
         message_ids = {result.message_id for result in search_results}
         if len(message_ids) != len(search_results):
             logger.error("not exactly one entry per message, cancelling")
@@ -275,56 +307,45 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
             for entry in final_entries:
                 await self.bot_log_channel.send(view=get_detail_view(entry))
 
+    @checks.is_staff_or_owner()
+    @commands.command(hidden=True)
+    async def search_cache_stats(self, ctx: commands.Context):
+        """Show how well the search cache and coalescing work"""
+        await ctx.reply(f"{len(search_cache.entries)} / {search_cache.max_size} cached searches, "
+                        f"{search_cache.hits} hits, {search_cache.misses} misses ({search_cache.hit_rate():.1%} hit rate), "
+                        f"{search_cache.evictions} evictions, {search_flights.saved_executions} of "
+                        f"{search_flights.executions + search_flights.saved_executions} queries saved by coalescing")
+
     @checks.is_staff_or_owner()
     @commands.command(hidden=True)
     async def rename_artist(self, ctx: commands.Context, old_name: str, new_name: str):
+        old_name_key = sqla_db.artist_name_key(old_name)
+
         async with sqla_db.Session() as db:
-            query_builder = db.get_query_builder()
-            query_builder.add_artist_filter([old_name])
+            if old_name_key == sqla_db.artist_name_key(new_name):
+                # artist names are matched ignoring case, so only the spelling of the artist changes
+                await db.set_artist_name(new_name)
+            else:
+                query_builder = db.get_query_builder()
+                query_builder.add_artist_filter([old_name])
 
-            entries = await query_builder.execute()
+                entries = await query_builder.execute()
 
-            for entry in entries:
-                entry.artists.remove(old_name)
-                entry.artists.append(new_name)
+                for entry in entries:
+                    entry.artists = [new_name if sqla_db.artist_name_key(artist) == old_name_key else artist
+                                     for artist in entry.artists]
 
-            await db.add_maps(entries)
+                await db.add_maps(entries)
 
         await ctx.reply("renamed")
 
     @checks.is_in_bot_channel()
-    @commands.command(rest_is_raw=True, aliases=["s"], description="Search map arts in the archive", help="""
-            search_args takes keyword value pairs in the format key:value or plain search terms.
-            recognized keys: palette, artist, type, page, size and order.
-            keys can be shortened (see examples)
-            use "-" to negate arguments
-            use quotes to use values containing whitespace
-            
-            valid map art types:
-            * flat
-            * dual-layered
-            * staircased
-            * semi-staircased
-            * unknown
-            
-            valid palettes:
-            * full colour
-            * two-colour
-            * carpet only
-            * greyscale
-            * unknown
-            
-            examples:
-            * miku             # search for all maps containing "miku" in the name or notes, or having "miku" as an artist, palette or type 
-            * type:staircased  # search for all staircased maps
-            * -t:flat          # search for all maps except flat ones
-            * pal:full         # search for full colour maps
-            * size:2x3         # search for all map arts that are 2 wide and 3 high
-            * size:=6          # search for all map arts thar contain exactly 6 individual maps (you can also use > >= < <=)
-            * a:aryezz         # search for map arts built by aryezz
-            * a:"some artist"  # search for map arts built by "some artist" (using quotes due to whitespace)""")
+    @commands.hybrid_command(rest_is_raw=True, aliases=["s"], description="Search map arts in the archive", help=search_help())
+    @search_options
     async def search(self, ctx: commands.Context, *, search_args: Annotated[
-        SearchArguments, SearchArgumentConverter(default_min_size=0, default_order_by="date")]):
+        SearchArguments, SearchArgumentConverter(default_min_size=0, default_order_by="date")] = None,
+                     artist: str | None = None, map_type: str | None = None, palette: str | None = None):
+        search_args = await add_search_options(ctx, search_args, artist, map_type, palette)
 
         try:
             search_results = await search_entries(search_args)
@@ -332,7 +353,7 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
             await ctx.send(str(error))
             return
 
-        if len(search_results.results) == 1:
+        if search_results.total == 1:
             await ctx.send(view=get_detail_view(search_results.results[0]))
             return
 
@@ -349,16 +370,18 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
     @commands.command()
     async def random(self, ctx: commands.Context):
         """Shows you a random map art from the archive"""
-        async with sqla_db.Session() as db:
+        async with sqla_db.Session(read_only=True) as db:
             entry = await db.get_random_map()
 
         if entry is not None:
             await ctx.send(view=get_detail_view(entry))
 
     @checks.is_in_bot_channel()
-    @commands.command(aliases=["largest"], rest_is_raw=True)
+    @commands.hybrid_command(aliases=["largest"], rest_is_raw=True)
+    @search_options
     async def biggest(self, ctx: commands.Context, *, search_args: Annotated[
-        SearchArguments, SearchArgumentConverter(default_min_size=32, default_order_by="size")]):
+        SearchArguments, SearchArgumentConverter(default_min_size=32, default_order_by="size")] = None,
+                      artist: str | None = None, map_type: str | None = None, palette: str | None = None):
         """The biggest map art on 2b2t
 
         Usage: !!biggest [search_args]
@@ -370,6 +393,7 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
             recognized keys: page, artist, type, palette, size and order.
             use "-" to negate arguments, e.g. -type:flat to filter flat maps.
         """
+        search_args = await add_search_options(ctx, search_args, artist, map_type, palette)
 
         try:
             search_results = await search_entries(search_args)
@@ -377,7 +401,7 @@ class MapArchiveCommands(commands.Cog, name="Map Archive"):
             await ctx.send(str(error))
             return
 
-        if len(search_results.results) == 1:
+        if search_results.total == 1:
             await ctx.send(view=get_detail_view(search_results.results[0]))
             return
 
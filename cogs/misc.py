@@ -47,6 +47,14 @@ class MiscCommands(commands.Cog, name="Misc"):
 
         await ctx.send("reloaded all cogs")
 
+    @commands.is_owner()
+    @commands.command(hidden=True)
+    async def sync(self, ctx):
+        """Registers the slash commands with discord"""
+        synced = await self.bot.tree.sync()
+
+        await ctx.send(f"synced {len(synced)} slash commands")
+
     @commands.command()
     async def uptime(self, ctx):
         """Shows the bot uptime"""
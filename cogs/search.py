@@ -1,10 +1,20 @@
+import array
+import asyncio
+import dataclasses
+import datetime
+import enum
 import math
 import re
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Literal
+from typing import Literal, Callable, Awaitable
 
+import discord
+from discord import app_commands
 from discord.ext import commands
 
+import config
 import sqla_db
 from map_archive_entry import MapArtType, MapArtPalette, MapArtArchiveEntry
 
@@ -19,49 +29,66 @@ class SearchArgument:
     raw_arg: str
 
 
+# one scanner for all argument forms, tried in order at the current position:
+# key: "value quoted", key: value, "value quoted", value
+ARGUMENT_PATTERN = re.compile(
+    r"\s*(?P<arg>"
+    r"(?P<quoted_key>\S+)\s*:\s*\"(?P<quoted_key_value>(?:[^\"\\]|\\.)*)\""
+    r"|(?P<plain_key>\S+)\s*:\s*(?P<plain_key_value>\S+)"
+    r"|-?\"(?P<quoted_value>(?:[^\"\\]|\\.)*)\""
+    r"|-?(?P<plain_value>\S+)"
+    r")"
+)
+ESCAPE_PATTERN = re.compile(r"\\(.)")
+
+
+def unescape(value: str) -> str:
+    return ESCAPE_PATTERN.sub(r"\1", value) if "\\" in value else value
+
+
+def quote(value: str) -> str:
+    """Quotes a value so the scanner reads it back as is, see unescape"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
 class MixedArgsConverter(commands.Converter):
     async def convert(self, ctx, argument) -> list[SearchArgument]:
         arguments: list[SearchArgument] = []
 
-        argument = argument.lstrip()
+        argument = argument.rstrip()
+        pos = 0
 
-        while argument:
-            # keyword argument with quoted value, e.g. key: "value quoted"
-            if match := re.match(r"(?P<key>\S+)\s*:\s*\"(?P<value>([^\"\\]|\\.)*)\"", argument):
-                key = match.group("key")
-                value = re.sub(r"\\(.)", r"\1", match.group("value")).strip()
-                if value:
-                    if exclude := key.startswith("-"):
-                        key = key[1:]
+        while pos < len(argument):
+            match = ARGUMENT_PATTERN.match(argument, pos)
 
-                    arguments.append(SearchArgument(exclude, key, value, match.group(0)))
-            # keyword argument with plain value, e.g. key: value
-            elif match := re.match(r"(?P<key>\S+)\s*:\s*(?P<value>\S+)", argument):
-                key = match.group("key")
-                value = match.group("value").strip()
-                if value:
-                    if exclude := key.startswith("-"):
-                        key = key[1:]
+            if match is None:
+                raise ValueError(f"cannot continue parsing `{argument[pos:].lstrip()}`")
 
-                    arguments.append(SearchArgument(exclude, key, value, match.group(0)))
-            # argument with quoted value, e.g. "value quoted"
-            elif match := re.match(r"-?\"(?P<value>([^\"\\]|\\.)*)\"", argument):
-                value = re.sub(r"\\(.)", r"\1", match.group("value")).strip()
-                if value:
-                    exclude = match.group(0).startswith("-")
+            groups = match.groupdict()
+            raw_arg = groups["arg"]
+            pos = match.end()
 
-                    arguments.append(SearchArgument(exclude, None, value, match.group(0)))
-            # argument with plain value, e.g. value
-            elif match := re.match(r"-?(?P<value>\S+)", argument):
-                value = match.group("value").strip()
-                exclude = match.group(0).startswith("-")
+            # keyword argument, e.g. key: "value quoted" or key: value
+            if groups["quoted_key"] is not None or groups["plain_key"] is not None:
+                if groups["quoted_key"] is not None:
+                    key, value = groups["quoted_key"], unescape(groups["quoted_key_value"]).strip()
+                else:
+                    key, value = groups["plain_key"], groups["plain_key_value"]
 
                 if value:
-                    arguments.append(SearchArgument(exclude, None, value, match.group(0)))
+                    if exclude := key.startswith("-"):
+                        key = key[1:]
+
+                    arguments.append(SearchArgument(exclude, key, value, raw_arg))
+            # argument without key, e.g. "value quoted" or value
             else:
-                raise ValueError(f"cannot continue parsing `{argument}`")
+                if groups["quoted_value"] is not None:
+                    value = unescape(groups["quoted_value"]).strip()
+                else:
+                    value = groups["plain_value"]
 
-            argument = argument[match.end():].lstrip()
+                if value:
+                    arguments.append(SearchArgument(raw_arg.startswith("-"), None, value, raw_arg))
 
         return arguments
 
@@ -76,6 +103,7 @@ class SearchArguments:
     excluded_artists: list[str] = field(default_factory=list)
     included_keywords: list[str] = field(default_factory=list)
     excluded_keywords: list[str] = field(default_factory=list)
+    message_ids: list[int] = field(default_factory=list)  # exact lookups, from message links or ids
 
     min_size: int | None = None
     max_size: int | None = None
@@ -87,6 +115,10 @@ class SearchArguments:
     page: int | None = None
     non_page_args: list[str] = field(default_factory=list)
 
+    # keyset cursors from the page hints, see encode_cursor
+    after: tuple | None = None
+    before: tuple | None = None
+
     # debug arguments
     filter_duplicates: bool = False
     filter_no_img: bool = False
@@ -135,44 +167,142 @@ def parse_size_arg(arg: str, search_args: SearchArguments) -> bool:
     return False
 
 
-def get_map_type(type_str: str) -> MapArtType | None:
-    """Returns the best effort mapping of the provided string to a MapArtType"""
-    if type_str.upper() in MapArtType:
-        return MapArtType(type_str.upper())
+CURSOR_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.UTC)
+
+
+def encode_cursor(entry: MapArtArchiveEntry, order_by: order_by_arg) -> str:
+    """Encodes the sort key values of an entry as a cursor for the page hints, e.g. 12.1735812000123000.345"""
+    create_date_us = (entry.create_date - CURSOR_EPOCH) // datetime.timedelta(microseconds=1)
+
+    if order_by == "size":
+        return f"{entry.total_maps}.{create_date_us}.{entry.map_id}"
+    return f"{create_date_us}.{entry.map_id}"
+
+
+def decode_cursor(cursor: str, order_by: order_by_arg) -> tuple:
+    """Decodes a cursor created by encode_cursor to the sort key values used by MapArtQueryBuilder.order_by"""
+    if not re.fullmatch(r"\d+(\.\d+){1,2}", cursor):
+        raise ValueError(f"invalid cursor `{cursor}`")
+
+    *area, create_date_us, map_id = [int(part) for part in cursor.split(".")]
+
+    if len(area) != (1 if order_by == "size" else 0):
+        raise ValueError("cursor doesn't match the search order")
+
+    create_date = CURSOR_EPOCH + datetime.timedelta(microseconds=create_date_us)
+    return *area, create_date, map_id
+
+
+def alias_key(alias: str) -> str:
+    return alias.lower().replace(" ", "").replace("-", "")
+
+
+class EnumAliases:
+    """Every accepted spelling of the members of an enum, built once so lookups are a dict access"""
+    def __init__(self, enum_type: type[enum.Enum]):
+        self.members = list(enum_type)
+
+        # full spellings of values and names, ignoring case, spaces and dashes
+        self.spellings: dict[str, enum.Enum] = {}
+        # prefixes of values, prefixes shared by multiple members are ambiguous and map to None
+        self.prefixes: dict[str, enum.Enum | None] = {}
 
-    for map_type in MapArtType:
-        if (map_type.value.lower() == type_str.lower() or
-            map_type.name.lower() == type_str.lower() or
-            map_type.name.lower().replace(" ", "").replace("-", "")
-                == type_str.lower().replace(" ", "").replace("-", "")):
-            return map_type
+        for member in self.members:
+            self.spellings[alias_key(member.value)] = member
+            self.spellings[alias_key(member.name)] = member
 
-    short_matches = [mt for mt in MapArtType if mt.value.lower().startswith(type_str.lower())]
+            for end in range(1, len(member.value) + 1):
+                prefix = member.value.lower()[:end]
+                self.prefixes[prefix] = None if prefix in self.prefixes else member
 
-    if len(short_matches) == 1:
-        return short_matches[0]
+    def resolve(self, alias: str) -> enum.Enum | None:
+        member = self.spellings.get(alias_key(alias))
 
-    return None
+        if member is None:
+            member = self.prefixes.get(alias.lower())
+
+        return member
+
+    def shortest(self, member: enum.Enum) -> str:
+        return min((prefix for prefix, prefix_member in self.prefixes.items() if prefix_member is member), key=len)
+
+    def complete(self, prefix: str) -> list[enum.Enum]:
+        """Returns the members an alias starting with prefix could resolve to"""
+        return [member for member in self.members
+                if member.value.startswith(prefix.lower()) or alias_key(member.name).startswith(alias_key(prefix))]
+
+
+type_aliases = EnumAliases(MapArtType)
+palette_aliases = EnumAliases(MapArtPalette)
+
+# keys can be shortened to any prefix, prefixes shared by multiple keys go to the first one
+argument_keys = ("palette", "artist", "type", "page", "size", "order", "after", "before")
+key_aliases: dict[str, str] = {}
+
+for argument_key in argument_keys:
+    for end in range(len(argument_key) + 1):
+        key_aliases.setdefault(argument_key[:end], argument_key)
+
+
+def shortest_key(key: str) -> str:
+    return min((alias for alias, aliased_key in key_aliases.items() if alias and aliased_key == key), key=len)
+
+
+def get_map_type(type_str: str) -> MapArtType | None:
+    """Returns the best effort mapping of the provided string to a MapArtType"""
+    return type_aliases.resolve(type_str)
 
 
 def get_map_palette(palette_str: str) -> MapArtPalette | None:
     """Returns the best effort mapping of the provided string to a MapArtPalette"""
-    if palette_str.upper() in MapArtPalette:
-        return MapArtPalette(palette_str.upper())
+    return palette_aliases.resolve(palette_str)
+
+
+async def artist_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    names = await sqla_db.artist_name_index.complete(current)
+    # choice names and values can't be longer than 100 characters
+    return [app_commands.Choice(name=name[:100], value=name[:100]) for name in names]
+
+
+async def type_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    return [app_commands.Choice(name=map_type.value, value=map_type.value) for map_type in type_aliases.complete(current)]
 
-    for map_palette in MapArtPalette:
-        if (map_palette.value.lower() == palette_str.lower() or
-            map_palette.name.lower() == palette_str.lower() or
-            map_palette.name.lower().replace(" ", "").replace("-", "")
-                == palette_str.lower().replace(" ", "").replace("-", "")):
-            return map_palette
 
-    short_matches = [mp for mp in MapArtPalette if mp.value.lower().startswith(palette_str.lower())]
+async def palette_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    return [app_commands.Choice(name=palette.value, value=palette.value) for palette in palette_aliases.complete(current)]
 
-    if len(short_matches) == 1:
-        return short_matches[0]
 
-    return None
+def search_help() -> str:
+    """Returns the !!search help, the keys and values are listed from the alias tables used for parsing"""
+    keys = ", ".join(f"{key} ({shortest_key(key)})" for key in argument_keys)
+    types = "\n".join(f"* {map_type} ({type_aliases.shortest(map_type)})" for map_type in type_aliases.members)
+    palettes = "\n".join(f"* {palette} ({palette_aliases.shortest(palette)})" for palette in palette_aliases.members)
+
+    return f"""search_args takes keyword value pairs in the format key:value or plain search terms.
+recognized keys (shortest form): {keys}
+keys and values can be shortened (see examples)
+use "-" to negate arguments
+use quotes to use values containing whitespace
+
+valid map art types (shortest form):
+{types}
+
+valid palettes (shortest form):
+{palettes}
+
+examples:
+* miku             # search for all maps containing "miku" in the name or notes, or having "miku" as an artist, palette or type 
+* type:staircased  # search for all staircased maps
+* -t:flat          # search for all maps except flat ones
+* pal:full         # search for full colour maps
+* size:2x3         # search for all map arts that are 2 wide and 3 high
+* size:=6          # search for all map arts thar contain exactly 6 individual maps (you can also use > >= < <=)
+* a:aryezz         # search for map arts built by aryezz
+* a:"some artist"  # search for map arts built by "some artist" (using quotes due to whitespace)"""
+
+
+# discord ids are snowflakes with 17 to 20 digits, message links are rewritten to the message id before parsing
+MESSAGE_ID_PATTERN = re.compile(r"\d{17,20}")
 
 
 class SearchArgumentConverter(MixedArgsConverter):
@@ -190,6 +320,7 @@ class SearchArgumentConverter(MixedArgsConverter):
         arguments = await super().convert(ctx, cleaned_args)
 
         search_arguments = SearchArguments()
+        cursors: list[tuple[str, str]] = []
 
         for arg in arguments:
             if arg.key is None:
@@ -215,6 +346,9 @@ class SearchArgumentConverter(MixedArgsConverter):
                     search_arguments.filter_duplicates = True
                 elif arg.raw_arg == "--noimg":
                     search_arguments.filter_no_img = True
+                elif MESSAGE_ID_PATTERN.fullmatch(arg.value) and not arg.exclude:
+                    self.default_min_size = min(self.default_min_size, 0)
+                    search_arguments.message_ids.append(int(arg.value))
                 else:
                     self.default_min_size = min(self.default_min_size, 0)
                     if arg.exclude:
@@ -223,7 +357,9 @@ class SearchArgumentConverter(MixedArgsConverter):
                         search_arguments.included_keywords.append(arg.value)
 
             else:
-                if "palette".startswith(arg.key):
+                key = key_aliases.get(arg.key)
+
+                if key == "palette":
                     map_palette = get_map_palette(arg.value)
                     if map_palette is None:
                         raise ValueError("couldn't parse palette value")
@@ -232,12 +368,12 @@ class SearchArgumentConverter(MixedArgsConverter):
                         search_arguments.excluded_palettes.append(map_palette)
                     else:
                         search_arguments.included_palettes.append(map_palette)
-                elif "artist".startswith(arg.key):
+                elif key == "artist":
                     if arg.exclude:
                         search_arguments.excluded_artists.append(arg.value)
                     else:
                         search_arguments.included_artists.append(arg.value)
-                elif "type".startswith(arg.key):
+                elif key == "type":
                     map_type = get_map_type(arg.value)
                     if map_type is None:
                         raise ValueError("couldn't parse type value")
@@ -246,7 +382,7 @@ class SearchArgumentConverter(MixedArgsConverter):
                         search_arguments.excluded_types.append(map_type)
                     else:
                         search_arguments.included_types.append(map_type)
-                elif "page".startswith(arg.key):
+                elif key == "page":
                     if arg.exclude:
                         raise ValueError("cannot use exclusion for argument `page`")
                     if search_arguments.page is not None:
@@ -254,12 +390,12 @@ class SearchArgumentConverter(MixedArgsConverter):
 
                     search_arguments.page = int(arg.value)
                     continue
-                elif "size".startswith(arg.key):
+                elif key == "size":
                     if arg.exclude:
                         raise ValueError("cannot use exclusion for argument `size`")
                     if not parse_size_arg(arg.value, search_arguments):
                         raise ValueError(f"cannot parse value `{arg.value}` for argument `size`")
-                elif "order".startswith(arg.key):
+                elif key == "order":
                     if search_arguments.order_by is not None:
                         raise ValueError("multiple order arguments encountered")
 
@@ -275,6 +411,11 @@ class SearchArgumentConverter(MixedArgsConverter):
 
                     search_arguments.order_by = order_arg
                     search_arguments.reverse_order = reverse
+                elif key in ("after", "before"):
+                    if arg.exclude:
+                        raise ValueError(f"cannot use exclusion for argument `{arg.key}`")
+                    cursors.append((key, arg.value))
+                    continue
                 else:
                     raise ValueError("unknown key, aborting")
 
@@ -287,23 +428,77 @@ class SearchArgumentConverter(MixedArgsConverter):
         if search_arguments.order_by is None:
             search_arguments.order_by = self.default_order_by
 
+        # cursors can only be decoded once the order is known
+        if len(cursors) > 1:
+            raise ValueError("multiple cursor arguments encountered")
+        for key, value in cursors:
+            if key == "after":
+                search_arguments.after = decode_cursor(value, search_arguments.order_by)
+            else:
+                search_arguments.before = decode_cursor(value, search_arguments.order_by)
+
         return search_arguments
 
 
+def search_options(command):
+    """Adds the descriptions and autocompletion of the artist, type and palette options, see add_search_options"""
+    command = app_commands.autocomplete(artist=artist_autocomplete, map_type=type_autocomplete,
+                                        palette=palette_autocomplete)(command)
+    command = app_commands.describe(artist="only maps by this artist", map_type="only maps of this type",
+                                    palette="only maps using this palette")(command)
+    return app_commands.rename(map_type="type")(command)
+
+
+async def add_search_options(ctx: commands.Context, search_args: SearchArguments | None, artist: str | None = None,
+                             map_type: str | None = None, palette: str | None = None,
+                             required: bool = False) -> SearchArguments:
+    """
+    Adds the artist, type and palette options of slash commands to the search, they are parsed like key:"value"
+    arguments by the converter of the command's search_args. Slash commands can leave search_args empty, unless the
+    search is required and none of the options are given either.
+    """
+    options = " ".join(f"{key}:{quote(value)}"
+                       for key, value in (("artist", artist), ("type", map_type), ("palette", palette)) if value)
+    parameter = ctx.command.clean_params["search_args"]
+
+    if search_args is None and not options and required:
+        raise commands.MissingRequiredArgument(parameter)
+
+    converter = parameter.converter
+    if search_args is None:
+        return await converter.convert(ctx, options)
+    if not options:
+        return search_args
+
+    option_args = await converter.convert(ctx, options)
+
+    search_args.included_artists.extend(option_args.included_artists)
+    search_args.included_types.extend(option_args.included_types)
+    search_args.included_palettes.extend(option_args.included_palettes)
+    search_args.non_page_args.extend(option_args.non_page_args)
+
+    return search_args
+
+
 @dataclass
 class SearchResults:
     page: int
     non_page_args: list[str]
-    results: list[MapArtArchiveEntry] = field(default_factory=list)
+    total: int = 0
+    results: list[MapArtArchiveEntry] = field(default_factory=list)  # only the entries of the requested page
+
+    # cursors for the page hints, see encode_cursor
+    next_cursor: str | None = None
+    previous_cursor: str | None = None
 
     def max_page(self, page_size: int = 10):
-        return math.ceil(len(self.results) / page_size)
+        return math.ceil(self.total / page_size)
 
     def page_valid(self, page_size: int = 10):
         return 0 < self.page <= self.max_page(page_size)
 
 
-def build_query(query: SearchArguments, query_builder: sqla_db.MapArtQueryBuilder):
+def build_query(query: SearchArguments, query_builder: sqla_db.MapArtQueryBuilder | sqla_db.IndexedQueryBuilder):
     query_builder.add_type_filter(include=query.included_types, exclude=query.excluded_types)
     query_builder.add_palette_filter(include=query.included_palettes, exclude=query.excluded_palettes)
 
@@ -314,26 +509,275 @@ def build_query(query: SearchArguments, query_builder: sqla_db.MapArtQueryBuilde
 
     query_builder.add_artist_filter(include=query.included_artists, exclude=query.excluded_artists)
     query_builder.add_search_filter(include=query.included_keywords, exclude=query.excluded_keywords)
+    query_builder.add_message_id_filter(query.message_ids)
 
-    query_builder.order_by(query.order_by, reverse=query.reverse_order)
+    query_builder.order_by(query.order_by, reverse=query.reverse_order, after=query.after, before=query.before)
 
     query_builder.add_size_filter(min_size=query.min_size, max_size=query.max_size, exact_size=query.exact_size)
 
 
-async def search_entries(search_query: SearchArguments) -> SearchResults:
-    results = SearchResults(search_query.page, search_query.non_page_args)
-
-    async with sqla_db.Session() as db:
+def get_query_builder(db: sqla_db.Session, query: SearchArguments) -> sqla_db.MapArtQueryBuilder | sqla_db.IndexedQueryBuilder:
+    """Builds the query on the archive index if it supports all filters of the search, on sqlite otherwise"""
+    if (config.search_index and not query.included_keywords and not query.excluded_keywords and not query.message_ids
+            and not query.filter_duplicates and not query.filter_no_img):
+        query_builder = db.get_indexed_query_builder()
+    else:
         query_builder = db.get_query_builder()
 
-        build_query(search_query, query_builder)
+    build_query(query, query_builder)
+
+    return query_builder
+
+
+def search_key(query: SearchArguments) -> tuple:
+    """Canonical key of everything that changes the results of a search, except the page and cursors"""
+    def values(items) -> tuple:
+        return tuple(sorted(set(str(item) for item in items)))
+
+    return (
+        values(query.included_types), values(query.excluded_types),
+        values(query.included_palettes), values(query.excluded_palettes),
+        values(map(sqla_db.artist_name_key, query.included_artists)),
+        values(map(sqla_db.artist_name_key, query.excluded_artists)),
+        values(query.included_keywords), values(query.excluded_keywords), values(query.message_ids),
+        query.min_size if query.min_size is not None and query.min_size > 1 else None,
+        query.max_size, query.exact_size, query.order_by, query.reverse_order,
+        query.filter_duplicates, query.filter_no_img,
+    )
+
+
+class SearchCache:
+    """LRU cache of the sorted map ids of whole searches, entries expire after ttl seconds or once maps change"""
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # search key -> (maps generation, time stored, map ids)
+        self.entries: OrderedDict[tuple, tuple[int, float, array.array]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> array.array | None:
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            generation, stored_at, map_ids = entry
+
+            if generation == sqla_db.Session.maps_generation and time.monotonic() - stored_at < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return map_ids
+
+            del self.entries[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, generation: int, map_ids: list[int]):
+        """generation needs to be read before the search ran, so results of a concurrent change are never cached"""
+        if self.max_size <= 0:
+            return
+
+        self.entries[key] = (generation, time.monotonic(), array.array("q", map_ids))
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
+search_cache = SearchCache(max_size=config.search_cache_size, ttl=config.search_cache_ttl)
+
+# searches with up to this many results are cached when they are shown or gambled on, larger ones are only counted
+# and paged in the query
+CACHE_FILL_LIMIT = 1000
+
+
+class SingleFlight:
+    """Lets concurrent calls with the same key wait for one shared execution instead of running their own"""
+    def __init__(self):
+        self.running: dict[tuple, asyncio.Task] = {}
+
+        self.executions = 0
+        self.saved_executions = 0
+
+    async def run(self, key: tuple, function: Callable[[], Awaitable]):
+        task = self.running.get(key)
+
+        if task is None:
+            # runs as its own task, so cancelling the first caller doesn't cancel it for everyone else
+            task = asyncio.create_task(function())
+            task.add_done_callback(lambda _: self.running.pop(key))
+            self.running[key] = task
+            self.executions += 1
+        else:
+            self.saved_executions += 1
+
+        return await asyncio.shield(task)
+
 
-        results.results = await query_builder.execute()
+search_flights = SingleFlight()
 
-    if len(results.results) == 0:
-        raise ValueError("No results")
 
-    if len(results.results) >= 2 and not results.page_valid():
-        raise ValueError(f"Invalid Page, select a page between 1 and {results.max_page()}")
+async def fill_search_cache(db: sqla_db.Session, search_query: SearchArguments, key: tuple, generation: int,
+                            total: int) -> array.array | None:
+    """Loads and caches the ids of a search with up to CACHE_FILL_LIMIT results, returns None for all other searches"""
+    if search_cache.max_size <= 0 or not 0 < total <= CACHE_FILL_LIMIT:
+        return None
+
+    query_builder = get_query_builder(db, dataclasses.replace(search_query, after=None, before=None))
+    map_ids = array.array("q", await query_builder.execute_ids())
+    search_cache.put(key, generation, map_ids)
+
+    return map_ids
+
+
+async def search_count(search_query: SearchArguments, fill_cache: bool = False) -> int:
+    """Number of maps matching the search, counted without loading the ids unless the search is cached or cacheable"""
+    key = search_key(search_query)
+    generation = sqla_db.Session.maps_generation
+
+    map_ids = search_cache.get(key)
+    if map_ids is not None:
+        return len(map_ids)
+
+    async with sqla_db.Session(read_only=True) as db:
+        count = await get_query_builder(db, search_query).count()
+
+        if fill_cache:
+            # showing the odds is usually followed by a gamble on the same search
+            await fill_search_cache(db, search_query, key, generation, count)
+
+    return count
+
+
+async def search_count_and_match(search_query: SearchArguments, map_id: int) -> tuple[int, bool]:
+    """Number of maps matching the search and whether the given map is one of them, fills the cache for repeated bets"""
+    key = search_key(search_query)
+    generation = sqla_db.Session.maps_generation
+
+    map_ids = search_cache.get(key)
+    if map_ids is not None:
+        return len(map_ids), map_id in map_ids
+
+    async with sqla_db.Session(read_only=True) as db:
+        count, match = await get_query_builder(db, search_query).count_and_match(map_id)
+        await fill_search_cache(db, search_query, key, generation, count)
+
+    return count, match
+
+
+async def search_exists(search_query: SearchArguments) -> bool:
+    """Whether any map matches the search"""
+    map_ids = search_cache.get(search_key(search_query))
+    if map_ids is not None:
+        return len(map_ids) > 0
+
+    async with sqla_db.Session(read_only=True) as db:
+        return await get_query_builder(db, search_query).exists()
+
+
+async def did_you_mean(search_query: SearchArguments) -> list[str]:
+    """Suggests similar arguments for the artists and keywords of a search without results"""
+    suggestions = []
+
+    for artist in search_query.included_artists:
+        suggestions.extend(f"`a:{quote(name)}`" for name in await sqla_db.fuzzy_index.suggest_artists(artist))
+
+    for keyword in search_query.included_keywords:
+        if (suggestion := await sqla_db.fuzzy_index.suggest_keyword(keyword)) is not None:
+            suggestions.append(f"`{quote(suggestion) if " " in suggestion else suggestion}`")
+
+    return suggestions
+
+
+def page_slice(map_ids: array.array, search_query: SearchArguments, page_size: int,
+               all_following: bool) -> array.array | None:
+    """Ids of the requested page in the sorted ids of the whole search, None if the map of the cursor isn't in them"""
+    # with a cursor the page number is only used for display, the cursor already points at the page
+    cursor = search_query.after or search_query.before
+    if cursor is None:
+        start = (search_query.page - 1) * page_size if len(map_ids) >= 2 else 0
+        return map_ids[start:None if all_following else start + page_size]
+
+    try:
+        # the map id is the last value of a cursor
+        position = map_ids.index(cursor[-1])
+    except ValueError:
+        return None
+
+    if search_query.after is not None:
+        return map_ids[position + 1:None if all_following else position + 1 + page_size]
+    return map_ids[0 if all_following else max(0, position - page_size):position]
+
+
+async def query_page_ids(search_query: SearchArguments, key: tuple, generation: int, page_size: int,
+                         all_following: bool) -> tuple[int, list[int] | None]:
+    """
+    Counts the search and pages it in the query, see page_slice for the returned ids.
+    Searches with up to CACHE_FILL_LIMIT results are loaded and cached whole instead, so their other pages are hits.
+    """
+    async with sqla_db.Session(read_only=True) as db:
+        query_builder = get_query_builder(db, search_query)
+        total = await query_builder.count()
+
+        map_ids = await fill_search_cache(db, search_query, key, generation, total)
+        if map_ids is not None:
+            page_ids = page_slice(map_ids, search_query, page_size, all_following)
+            return len(map_ids), None if page_ids is None else list(page_ids)
+
+        if total == 0 or total >= 2 and not SearchResults(search_query.page, [], total).page_valid(page_size):
+            return total, []
+
+        limit = None if all_following else page_size
+        if search_query.after is None and search_query.before is None:
+            offset = (search_query.page - 1) * page_size if total >= 2 else 0
+            return total, await query_builder.execute_ids(limit=limit, offset=offset)
+
+        return total, await query_builder.execute_ids(limit=limit)
+
+
+async def search_entries(search_query: SearchArguments, page_size: int = 10,
+                         all_following: bool = False) -> SearchResults:
+    """Fetches the requested page of a search, or every entry from that page on if all_following is set"""
+    results = SearchResults(search_query.page, search_query.non_page_args)
+    key = search_key(search_query)
+
+    map_ids = search_cache.get(key)
+    if map_ids is not None:
+        results.total = len(map_ids)
+        page_ids = page_slice(map_ids, search_query, page_size, all_following)
+    else:
+        # pages of searches that aren't cached are read with LIMIT / OFFSET or the cursor seek
+        generation = sqla_db.Session.maps_generation
+        flight_key = ("page", generation, key, search_query.page, search_query.after, search_query.before,
+                      page_size, all_following)
+        results.total, page_ids = await search_flights.run(
+            flight_key, lambda: query_page_ids(search_query, key, generation, page_size, all_following))
+
+    if results.total == 0:
+        suggestions = await did_you_mean(search_query)
+        raise ValueError(f"No results, did you mean {" or ".join(suggestions)}?" if suggestions else "No results")
+
+    if results.total >= 2 and not results.page_valid(page_size):
+        raise ValueError(f"Invalid Page, select a page between 1 and {results.max_page(page_size)}")
+
+    async with sqla_db.Session(read_only=True) as db:
+        if page_ids is None:
+            # the map of the cursor doesn't match the search anymore, seek by its sort key values instead
+            query_builder = get_query_builder(db, search_query)
+            page_ids = await query_builder.execute_ids(limit=None if all_following else page_size)
+
+        results.results = await db.get_maps(list(page_ids))
+
+    if results.results:
+        results.next_cursor = encode_cursor(results.results[-1], search_query.order_by)
+        results.previous_cursor = encode_cursor(results.results[0], search_query.order_by)
 
     return results
@@ -11,6 +11,16 @@ map_artists_guild_id = int(os.environ.get('GUILD', 349201680023289867))
 map_archive_channel_id = int(os.environ.get('ARCHIVE', 349277718954901514))
 bot_log_channel_id = int(os.environ.get('BOT_LOG', 1409872078508920872))
 
+db_path = os.environ.get("DB_PATH", "map_art.db")  # SQLite database file
+storage_profile = os.environ.get("STORAGE_PROFILE", "wal")  # SQLite pragmas to use, see sqla_db.STORAGE_PROFILES
+search_index = bool(int(os.environ.get("SEARCH_INDEX", 1)))  # filter searches without keywords in memory
+search_cache_size = int(os.environ.get("SEARCH_CACHE_SIZE", 256))  # number of cached searches, 0 disables the cache
+search_cache_ttl = int(os.environ.get("SEARCH_CACHE_TTL", 600))  # seconds until a cached search expires
+
+# gambling balance changes are written to the database in batches
+balance_flush_interval_ms = int(os.environ.get("BALANCE_FLUSH_INTERVAL_MS", 1000))  # max time between writes
+balance_flush_max_ops = int(os.environ.get("BALANCE_FLUSH_MAX_OPS", 50))  # write early once this many changes are queued
+
 channel_blacklist = loads(os.environ["BLACKLIST"])  # List of channels IDs to ignore
 # BLACKLIST environment variable format: '[111111111111111111, 222222222222222222]'
 # replace channel ID placeholders
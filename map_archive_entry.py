@@ -1,5 +1,5 @@
 import enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from datetime import datetime
 from typing import List, Optional
@@ -29,7 +29,7 @@ class MapArtPalette(enum.Enum):
         return self.value
 
 
-@dataclass
+@dataclass(slots=True)
 class MapArtArchiveEntry:
     width: int
     height: int
@@ -45,29 +45,49 @@ class MapArtArchiveEntry:
     map_id: Optional[int] = None
     flagged: bool = False
 
+    # derived strings with the field values they were built from, built on first use and again once a field changed
+    _link: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _artists_str: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _line: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+
     @property
     def total_maps(self):
         return self.width * self.height
 
     @property
     def link(self):
-        return f"https://discord.com/channels/{config.map_artists_guild_id}/{config.map_archive_channel_id}/{self.message_id}"
+        if self._link is None or self._link[0] != self.message_id:
+            self._link = (self.message_id, f"https://discord.com/channels/{config.map_artists_guild_id}/{config.map_archive_channel_id}/{self.message_id}")
+
+        return self._link[1]
 
     @property
     def artists_str(self):
         """Returns a grammatically correct, comma-separated string of artist names."""
-        names = [artist for artist in self.artists]
-        if len(names) == 0:
-            return ""
-        if len(names) == 1:
-            return names[0]
-        if len(names) == 2:
-            return f"{names[0]} and {names[1]}"
-        return f"{', '.join(names[:-1])}, and {names[-1]}"
+        names = tuple(self.artists)
+
+        if self._artists_str is None or self._artists_str[0] != names:
+            if len(names) == 0:
+                artists_str = ""
+            elif len(names) == 1:
+                artists_str = names[0]
+            elif len(names) == 2:
+                artists_str = f"{names[0]} and {names[1]}"
+            else:
+                artists_str = f"{', '.join(names[:-1])}, and {names[-1]}"
+
+            self._artists_str = (names, artists_str)
+
+        return self._artists_str[1]
 
     @property
     def line(self):
-        size_info = f"{self.width} x {self.height} ({self.total_maps} {"map" if self.total_maps == 1 else "maps"})"
-        extra_info = f"[{self.map_type}, {self.palette}] - [**{self.name}**]({self.link}) by **{self.artists_str if len(self.artists) > 0 else "?"}**"
+        fields = (self.width, self.height, self.map_type, self.palette, self.name, self.message_id, *self.artists)
+
+        if self._line is None or self._line[0] != fields:
+            size_info = f"{self.width} x {self.height} ({self.total_maps} {"map" if self.total_maps == 1 else "maps"})"
+            extra_info = f"[{self.map_type}, {self.palette}] - [**{self.name}**]({self.link}) by **{self.artists_str if len(self.artists) > 0 else "?"}**"
+
+            self._line = (fields, size_info + " - " + extra_info)
 
-        return size_info + " - " + extra_info
\ No newline at end of file
+        return self._line[1]
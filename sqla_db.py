@@ -1,18 +1,33 @@
+import array
+import asyncio
+import bisect
+import itertools
 import logging
 import datetime
+import heapq
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
 from typing import Iterable, Literal
 
 import sqlalchemy.ext.asyncio
 from sqlalchemy import Column, Integer, String, ForeignKey, Table, select, Enum, desc, func, or_, DateTime, Boolean, \
-    not_, and_, Select, asc
+    not_, and_, Select, asc, ColumnElement, MetaData, delete, insert, text, Computed, Index, update, bindparam, \
+    event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import relationship
 
+import config
 from map_archive_entry import MapArtType, MapArtPalette, MapArtArchiveEntry
 
 logger = logging.getLogger("discord.db")
 
+ADD_MAPS_BATCH_SIZE = 500
+
 
 class Base(DeclarativeBase):
     pass
@@ -21,22 +36,38 @@ class Base(DeclarativeBase):
 artist_mapart = Table(
     "artist_mapart",
     Base.metadata,
-    Column("artist_id", Integer, ForeignKey("artist.artist_id")),
-    Column("map_id", Integer, ForeignKey("map_art.map_id"))
+    Column("artist_id", Integer, ForeignKey("artist.artist_id"), primary_key=True),
+    Column("map_id", Integer, ForeignKey("map_art.map_id"), primary_key=True),
+    Column("position", Integer, nullable=False),  # the artists of a map are listed in the order they were entered
+    Index("ix_artist_mapart_map_id_position", "map_id", "position", "artist_id"),
 )
 
 
+STARTING_BALANCE = 1000
+
+
 class Balance(Base):
     __tablename__ = "balance"
     discord_id = Column(Integer, primary_key=True)
-    balance = Column(Integer, default=1000)
+    balance = Column(Integer, default=STARTING_BALANCE)
     total_bets = Column(Integer, default=0)
 
 
+def clean_artist_name(name: str) -> str:
+    """Artist names are stored without line breaks and surrounding whitespace"""
+    return name.replace("\r", "").replace("\n", "").strip()
+
+
+def artist_name_key(name: str) -> str:
+    """Normalized artist name used for lookups, artist names are matched ignoring case and whitespace"""
+    return " ".join(name.split()).casefold()
+
+
 class MapArtArtist(Base):
     __tablename__ = "artist"
     artist_id = Column(Integer, primary_key=True)
     name = Column(String, unique=True)
+    name_key = Column(String, index=True, unique=True)  # see artist_name_key
     maps = relationship("MapArtArchiveDBEntry", secondary=artist_mapart, back_populates="artists")
 
     def __str__(self):
@@ -48,198 +79,913 @@ class MapArtArchiveDBEntry(Base):
     map_id = Column(Integer, primary_key=True)
     width = Column(Integer)
     height = Column(Integer)
-    type = Column(Enum(MapArtType), nullable=False)
-    palette = Column(Enum(MapArtPalette), nullable=False)
+    area = Column(Integer, Computed("width * height", persisted=True))
+    type = Column(Enum(MapArtType), nullable=False, index=True)
+    palette = Column(Enum(MapArtPalette), nullable=False, index=True)
     name = Column(String)
-    artists = relationship("MapArtArtist", secondary=artist_mapart, back_populates="maps", lazy="selectin")
+    artists = relationship("MapArtArtist", secondary=artist_mapart, back_populates="maps", lazy="selectin",
+                           order_by=artist_mapart.c.position)
     notes = Column(String)
     image_url = Column(String)
-    create_date = Column(DateTime)
+    create_date = Column(DateTime, index=True)
     author_id = Column(Integer)
-    message_id = Column(Integer)
+    message_id = Column(Integer, index=True)
     flagged = Column(Boolean)
 
-    @property
-    def create_date_utc(self):
-        return self.create_date.replace(tzinfo=datetime.UTC)
-
-    def as_entry(self):
-        fixed_artists = []
-        for artist in self.artists:
-            fixed_artist = artist.name.replace("\r", "").replace("\n", "").strip()
-            if fixed_artist:
-                fixed_artists.append(fixed_artist)
-
-        return MapArtArchiveEntry(
-            map_id=self.map_id,
-            width=self.width,
-            height=self.height,
-            map_type=self.type,
-            palette=self.palette,
-            name=self.name,
-            artists=fixed_artists,
-            notes=self.notes,
-            image_url=self.image_url,
-            create_date=self.create_date_utc,
-            author_id=self.author_id,
-            message_id=self.message_id,
-            flagged=self.flagged,
-        )
+    __table_args__ = (
+        # matches the size order in both directions, see MapArtQueryBuilder.order_by
+        Index("ix_map_art_area_create_date", area.desc(), create_date),
+    )
+
+
+# columns written by Session.add_maps, area is generated by the database
+MAP_COLUMNS = [column.name for column in MapArtArchiveDBEntry.__table__.columns if column.computed is None]
+
+ARTIST_SEPARATOR = "\x1f"
+
+# artist names of the map of the enclosing statement, in the order they were entered
+ordered_artist_names = (select(MapArtArtist.name)
+                        .join(artist_mapart)
+                        .where(artist_mapart.c.map_id == MapArtArchiveDBEntry.map_id)
+                        .order_by(artist_mapart.c.position)
+                        .correlate(MapArtArchiveDBEntry)
+                        .subquery())
+
+# columns entries are read from, the artist names of each map are concatenated in the same statement
+ENTRY_COLUMNS = [
+    *(getattr(MapArtArchiveDBEntry, column) for column in MAP_COLUMNS),
+    # group_concat keeps the order of the ordered subquery
+    select(func.group_concat(ordered_artist_names.c.name, ARTIST_SEPARATOR))
+    .scalar_subquery()
+    .label("artists"),
+]
+
+
+def entry_from_row(row) -> MapArtArchiveEntry:
+    """Builds an entry from a row of ENTRY_COLUMNS"""
+    return MapArtArchiveEntry(
+        map_id=row.map_id,
+        width=row.width,
+        height=row.height,
+        map_type=row.type,
+        palette=row.palette,
+        name=row.name,
+        # the same artists appear on many maps, interning lets their entries share the strings
+        artists=list(map(sys.intern, row.artists.split(ARTIST_SEPARATOR))) if row.artists else [],
+        notes=row.notes,
+        image_url=row.image_url,
+        create_date=row.create_date.replace(tzinfo=datetime.UTC),
+        author_id=row.author_id,
+        message_id=row.message_id,
+        flagged=row.flagged,
+    )
+
+
+# FTS5 index over map names, notes and artist names for keyword search, rowid is the map_id.
+# Virtual tables can't be created through the metadata, so the table lives in its own metadata and is created below.
+map_art_fts = Table(
+    "map_art_fts",
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("name", String),
+    Column("notes", String),
+    Column("artists", String),
+    Column("map_art_fts", String),  # hidden column used as the left side of MATCH
+)
+
+
+async def table_columns(conn: sqlalchemy.ext.asyncio.AsyncConnection, table: Table) -> dict[str, bool] | None:
+    """Returns the columns of the table in the database and whether they are part of the primary key"""
+    rows = (await conn.execute(text(f"PRAGMA table_xinfo({table.name})"))).mappings().all()
+    return {row["name"]: row["pk"] > 0 for row in rows} if rows else None
+
+
+async def rebuild_table(conn: sqlalchemy.ext.asyncio.AsyncConnection, table: Table):
+    """Recreates a table from the metadata and copies its rows, for changes sqlite can't do with ALTER TABLE"""
+    old_name = f"{table.name}_old"
+    columns = ", ".join(column.name for column in table.columns if column.computed is None)
+
+    # legacy mode keeps the foreign keys of other tables pointing to the original table name
+    await conn.execute(text("PRAGMA legacy_alter_table = ON"))
+    await conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {old_name}"))
+    await conn.execute(text("PRAGMA legacy_alter_table = OFF"))
+
+    await conn.run_sync(table.create)
+    await conn.execute(text(f"INSERT OR IGNORE INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}"))
+    await conn.execute(text(f"DROP TABLE {old_name}"))
+
+    logger.info(f"migrated table {table.name}")
+
+
+async def fill_artist_name_keys(conn: sqlalchemy.ext.asyncio.AsyncConnection):
+    """Fills the name_key column, artists whose names only differ in case or whitespace are merged into the oldest one"""
+    artists = (await conn.execute(
+        select(MapArtArtist.artist_id, MapArtArtist.name).order_by(MapArtArtist.artist_id))).all()
+
+    artist_ids_by_key: dict[str, int] = {}
+    for artist_id, name in artists:
+        name_key = artist_name_key(name)
+
+        if name_key not in artist_ids_by_key:
+            artist_ids_by_key[name_key] = artist_id
+            await conn.execute(update(MapArtArtist).where(MapArtArtist.artist_id == artist_id).values(name_key=name_key))
+            continue
+
+        await merge_artist(conn, artist_id, artist_ids_by_key[name_key])
+        logger.info(f"merged artist {name} into artist with id {artist_ids_by_key[name_key]}")
+
+
+async def merge_artist(conn: sqlalchemy.ext.asyncio.AsyncConnection, artist_id: int, kept_id: int | None):
+    """Moves the maps of an artist to the kept artist and deletes it, without a kept artist the maps lose the artist"""
+    if kept_id is not None:
+        # maps which already list the kept artist are skipped by OR IGNORE and cleaned up by the delete
+        await conn.execute(text("UPDATE OR IGNORE artist_mapart SET artist_id = :kept_id WHERE artist_id = :artist_id"),
+                           {"kept_id": kept_id, "artist_id": artist_id})
+    await conn.execute(delete(artist_mapart).where(artist_mapart.c.artist_id == artist_id))
+    await conn.execute(delete(MapArtArtist).where(MapArtArtist.artist_id == artist_id))
+
+
+async def clean_stored_artist_names(conn: sqlalchemy.ext.asyncio.AsyncConnection):
+    """Cleans artist names stored before names were cleaned on write, see clean_artist_name"""
+    name = MapArtArtist.name
+    dirty_artists = (await conn.execute(
+        select(MapArtArtist.artist_id, name)
+        .where(or_(name != func.trim(name), name.contains("\r"), name.contains("\n")))
+        .order_by(MapArtArtist.artist_id))).all()
+
+    for artist_id, dirty_name in dirty_artists:
+        cleaned_name = clean_artist_name(dirty_name)
+        name_key = artist_name_key(cleaned_name)
+
+        kept_id = (await conn.execute(
+            select(MapArtArtist.artist_id).where(MapArtArtist.name_key == name_key, MapArtArtist.artist_id != artist_id))).scalar()
+
+        if cleaned_name and kept_id is None:
+            await conn.execute(update(MapArtArtist).where(MapArtArtist.artist_id == artist_id)
+                               .values(name=cleaned_name, name_key=name_key))
+        else:
+            await merge_artist(conn, artist_id, kept_id if cleaned_name else None)
+
+    if len(dirty_artists) > 0:
+        logger.info(f"cleaned {len(dirty_artists)} artist names")
+
+
+async def fill_artist_positions(conn: sqlalchemy.ext.asyncio.AsyncConnection):
+    """Adds the position column, associations were always inserted in the order the artists were entered"""
+    await conn.execute(text("ALTER TABLE artist_mapart ADD COLUMN position INTEGER NOT NULL DEFAULT 0"))
+    await conn.execute(text(
+        "UPDATE artist_mapart SET position = numbered.position FROM ("
+        "SELECT rowid AS association_rowid, row_number() OVER (PARTITION BY map_id ORDER BY rowid) - 1 AS position "
+        "FROM artist_mapart) AS numbered WHERE artist_mapart.rowid = numbered.association_rowid"))
+
+    # replaced by ix_artist_mapart_map_id_position
+    await conn.execute(text("DROP INDEX IF EXISTS ix_artist_mapart_map_id"))
+
+    logger.info("added artist positions to table artist_mapart")
+
+
+async def migrate_schema(conn: sqlalchemy.ext.asyncio.AsyncConnection):
+    map_art_columns = await table_columns(conn, MapArtArchiveDBEntry.__table__)
+    if map_art_columns is not None and "area" not in map_art_columns:
+        await rebuild_table(conn, MapArtArchiveDBEntry.__table__)
+
+    artist_mapart_columns = await table_columns(conn, artist_mapart)
+    if artist_mapart_columns is not None and "position" not in artist_mapart_columns:
+        await fill_artist_positions(conn)
+    if artist_mapart_columns is not None and not any(artist_mapart_columns.values()):
+        await rebuild_table(conn, artist_mapart)
+
+    artist_columns = await table_columns(conn, MapArtArtist.__table__)
+    if artist_columns is not None and "name_key" not in artist_columns:
+        await conn.execute(text("ALTER TABLE artist ADD COLUMN name_key VARCHAR"))
+        await fill_artist_name_keys(conn)
+        logger.info("migrated table artist")
+
+    if artist_columns is not None:
+        await clean_stored_artist_names(conn)
 
 
 async def create_schema():
     async with Session.engine.begin() as conn:
+        await migrate_schema(conn)
         await conn.run_sync(Base.metadata.create_all)
 
+        # create_all only creates indexes together with their table
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                await conn.run_sync(index.create, checkfirst=True)
+
+        fts_exists = (await conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'map_art_fts'"))).first() is not None
+
+        if not fts_exists:
+            await conn.execute(text(
+                "CREATE VIRTUAL TABLE map_art_fts USING fts5("
+                "name, notes, artists, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"))
+
+            # fill the index for databases created before it existed
+            artist_names = (select(func.group_concat(MapArtArtist.name, " "))
+                            .join(artist_mapart)
+                            .where(artist_mapart.c.map_id == MapArtArchiveDBEntry.map_id)
+                            .scalar_subquery())
+            await conn.execute(insert(map_art_fts).from_select(
+                ["rowid", "name", "notes", "artists"],
+                select(MapArtArchiveDBEntry.map_id, MapArtArchiveDBEntry.name, MapArtArchiveDBEntry.notes, artist_names)))
+            logger.info("created full-text search index")
+
+
+class MapIdSampler:
+    """Keeps the ids of all maps in memory, so random maps can be picked without sorting the whole table"""
+    def __init__(self):
+        self.map_ids = array.array("q")
+        self.generation = 0  # bumped whenever maps are added or deleted
+        self.loaded_generation = -1
+
+    def invalidate(self):
+        self.generation += 1
+
+    async def refresh(self, session: sqlalchemy.ext.asyncio.AsyncSession):
+        generation = self.generation
+        map_ids = (await session.execute(select(MapArtArchiveDBEntry.map_id))).scalars().all()
+
+        self.map_ids = array.array("q", map_ids)
+        self.loaded_generation = generation
+        logger.info(f"loaded {len(self.map_ids)} map ids for random selection")
+
+    async def pick(self, session: sqlalchemy.ext.asyncio.AsyncSession) -> int | None:
+        """Picks a map id uniformly at random, returns None if there are no maps"""
+        if self.loaded_generation != self.generation:
+            await self.refresh(session)
+
+        return random.choice(self.map_ids) if len(self.map_ids) > 0 else None
+
+    async def count(self, session: sqlalchemy.ext.asyncio.AsyncSession) -> int:
+        if self.loaded_generation != self.generation:
+            await self.refresh(session)
+
+        return len(self.map_ids)
+
+
+map_id_sampler = MapIdSampler()
+
+
+INDEX_EPOCH = datetime.datetime(1970, 1, 1)
+
+# translates the digits of bin() to 0 / 1 bytes, see bitset_to_slots
+BIT_DIGITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def slots_to_bitset(slots: list[int]) -> int:
+    bits = bytearray((max(slots) >> 3) + 1)
+    for slot in slots:
+        bits[slot >> 3] |= 1 << (slot & 7)
+
+    return int.from_bytes(bits, "little")
+
+
+def bitset_to_flags(bitset: int, size: int) -> bytes:
+    """One byte per slot, 1 if the slot is in the bitset"""
+    return bin(bitset)[:1:-1].encode().translate(BIT_DIGITS).ljust(size, b"\x00")
+
+
+def index_timestamp(date: datetime.datetime) -> int:
+    """create_date in microseconds, dates without a timezone are stored as UTC"""
+    return (date.replace(tzinfo=None) - INDEX_EPOCH) // datetime.timedelta(microseconds=1)
+
+
+class ArchiveIndex:
+    """
+    Keeps the filterable columns of all maps in memory, so searches without keywords don't need sqlite to filter and
+    sort. SQLite stays the source of truth, the index is refreshed after every session that changed maps.
+
+    Every map has a slot, the sort keys are stored per slot and every type, palette, area, size and artist has a
+    bitset (a python int) of the slots that have it. Filters combine the bitsets with bitwise operations, pages are
+    collected by walking the slots in sort order until enough of them matched.
+    """
+    def __init__(self):
+        self.loaded = False
+        self.lock = asyncio.Lock()
+        self.clear()
+
+    def clear(self):
+        self.slots: dict[int, int] = {}  # map id -> slot
+        self.free_slots: list[int] = []
+        self.slot_values: list[tuple] = []  # slot -> (kind, value) pairs the slot is in the bitsets of
+        self.sort_keys: dict[str, list[tuple]] = {
+            "date": [],  # slot -> (create date, map id)
+            "size": [],  # slot -> (-area, create date, map id)
+        }
+        self.orders: dict[str, array.array] = {}  # slots sorted by the sort keys, see order
+        # kind -> value -> bitset, kinds are "live", "type", "palette", "area", "size" and "artist" (by name key)
+        self.bitsets: dict[str, dict] = defaultdict(dict)
+
+    async def load(self):
+        async with self.lock:
+            await self.reload()
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            async with self.lock:
+                if not self.loaded:
+                    await self.reload()
+
+    async def reload(self):
+        # the snapshot is only taken once the lock is held, so no refresh can be overwritten with older data
+        async with Session(read_only=True) as db:
+            rows = await self.fetch_rows(db.session)
+
+        self.clear()
+        self.apply(rows)
+        self.loaded = True
+
+        logger.info(f"indexed {len(self.slots)} maps")
+
+    async def refresh(self, map_ids: Iterable[int]):
+        """Reloads the given maps from the database, called after they were changed"""
+        async with self.lock:
+            if not self.loaded:
+                return
+
+            try:
+                async with Session(read_only=True) as db:
+                    rows = {}
+                    for batch in itertools.batched(map_ids, ADD_MAPS_BATCH_SIZE):
+                        rows |= dict.fromkeys(batch)  # deleted maps stay None
+                        rows |= await self.fetch_rows(db.session, batch)
+            except Exception as error:
+                # the index is loaded again on the next search
+                logger.error("error while refreshing the archive index", exc_info=error)
+                self.loaded = False
+                return
+
+            self.apply(rows)
+
+    @staticmethod
+    async def fetch_rows(session: sqlalchemy.ext.asyncio.AsyncSession, map_ids: Iterable[int] | None = None) -> dict[int, tuple]:
+        map_query = select(MapArtArchiveDBEntry.map_id, MapArtArchiveDBEntry.width, MapArtArchiveDBEntry.height,
+                           MapArtArchiveDBEntry.type, MapArtArchiveDBEntry.palette, MapArtArchiveDBEntry.create_date)
+        artist_query = (select(artist_mapart.c.map_id, MapArtArtist.name_key)
+                        .join(MapArtArtist, MapArtArtist.artist_id == artist_mapart.c.artist_id))
+
+        if map_ids is not None:
+            map_query = map_query.where(MapArtArchiveDBEntry.map_id.in_(map_ids))
+            artist_query = artist_query.where(artist_mapart.c.map_id.in_(map_ids))
+
+        artist_keys = defaultdict(list)
+        for map_id, name_key in await session.execute(artist_query):
+            artist_keys[map_id].append(name_key)
+
+        return {map_id: (width, height, map_type, palette, create_date, artist_keys[map_id])
+                for map_id, width, height, map_type, palette, create_date in await session.execute(map_query)}
+
+    def apply(self, rows: dict[int, tuple | None]):
+        """Updates the index with rows from fetch_rows, None removes the map"""
+        removed = defaultdict(list)  # (kind, value) -> slots
+        added = defaultdict(list)
+
+        for map_id, row in rows.items():
+            slot = self.slots.get(map_id)
+
+            if slot is not None:
+                for kind_value in self.slot_values[slot]:
+                    removed[kind_value].append(slot)
+                self.slot_values[slot] = ()
+
+                if row is None:
+                    del self.slots[map_id]
+                    self.free_slots.append(slot)
+                    continue
+            elif row is None:
+                continue
+            elif self.free_slots:
+                slot = self.slots[map_id] = self.free_slots.pop()
+            else:
+                slot = self.slots[map_id] = len(self.slot_values)
+                self.slot_values.append(())
+                for keys in self.sort_keys.values():
+                    keys.append(())
+
+            width, height, map_type, palette, create_date, artist_keys = row
+            timestamp = index_timestamp(create_date)
+
+            self.sort_keys["date"][slot] = (timestamp, map_id)
+            self.sort_keys["size"][slot] = (-width * height, timestamp, map_id)
+            self.slot_values[slot] = (("live", None), ("type", map_type), ("palette", palette),
+                                      ("area", width * height), ("size", (width, height)),
+                                      *(("artist", name_key) for name_key in artist_keys))
+
+            for kind_value in self.slot_values[slot]:
+                added[kind_value].append(slot)
+
+        for (kind, value), slots in removed.items():
+            bitset = self.bitsets[kind][value] & ~slots_to_bitset(slots)
+            if bitset:
+                self.bitsets[kind][value] = bitset
+            else:
+                del self.bitsets[kind][value]
+
+        for (kind, value), slots in added.items():
+            self.bitsets[kind][value] = self.bitsets[kind].get(value, 0) | slots_to_bitset(slots)
+
+        if len(rows) > 0:
+            self.orders = {}
+
+    def order(self, field: str) -> array.array:
+        """All used slots sorted by a sort key, sorted again on the first search after maps changed"""
+        if field not in self.orders:
+            self.orders[field] = array.array("q", sorted(self.slots.values(), key=self.sort_keys[field].__getitem__))
+
+        return self.orders[field]
+
+    def bitset(self, kind: str, value) -> int:
+        return self.bitsets[kind].get(value, 0)
+
+    def union(self, kind: str, values: Iterable) -> int:
+        bitset = 0
+        for value in values:
+            bitset |= self.bitset(kind, value)
+
+        return bitset
+
+
+archive_index = ArchiveIndex()
+
+
+class ArtistNameIndex:
+    """
+    Sorted artist names for autocompletion. Every name is indexed by its name key and by the name key from each
+    later word on, so "smith" also completes "John Smith". Loaded on first use and again after artists changed.
+    """
+    def __init__(self):
+        self.keys: list[str] = []  # sorted name keys, from the start of a name or a later word
+        self.artist_slots: list[int] = []  # key -> position in names and map_counts
+        self.names: list[str] = []
+        self.map_counts: list[int] = []
+        self.generation = 0  # bumped whenever artists or their maps changed
+        self.loaded_generation = -1
+        self.lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.generation += 1
+
+    async def refresh(self):
+        generation = self.generation
+
+        # only artists with maps are suggested, orphans stay in the table until the next maintenance
+        async with Session(read_only=True) as db:
+            rows = (await db.session.execute(
+                select(MapArtArtist.name, func.count())
+                .join(artist_mapart, artist_mapart.c.artist_id == MapArtArtist.artist_id)
+                .group_by(MapArtArtist.artist_id))).all()
+
+        entries = []
+        for artist_slot, (name, _) in enumerate(rows):
+            words = artist_name_key(name).split(" ")
+            entries.extend((" ".join(words[start:]), artist_slot) for start in range(len(words)))
+        entries.sort()
+
+        self.keys = [key for key, _ in entries]
+        self.artist_slots = [artist_slot for _, artist_slot in entries]
+        self.names = [name for name, _ in rows]
+        self.map_counts = [map_count for _, map_count in rows]
+        self.loaded_generation = generation
+        logger.info(f"indexed {len(self.names)} artist names")
+
+    async def complete(self, prefix: str, limit: int = 25) -> list[str]:
+        """Returns up to limit artist names starting with prefix, artists with more maps first"""
+        if self.loaded_generation != self.generation:
+            async with self.lock:
+                if self.loaded_generation != self.generation:
+                    await self.refresh()
+
+        prefix_key = artist_name_key(prefix)
+        start = bisect.bisect_left(self.keys, prefix_key)
+        end = bisect.bisect_left(self.keys, prefix_key + "\U0010ffff", lo=start)
+
+        artist_slots = set(self.artist_slots[start:end])
+        best = heapq.nsmallest(limit, artist_slots, key=lambda slot: (-self.map_counts[slot], self.names[slot].casefold()))
+
+        return [self.names[slot] for slot in best]
+
+
+artist_name_index = ArtistNameIndex()
+
+
+# words as split by the full-text index tokenizer, see map_art_fts
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def trigrams(term: str) -> set[str]:
+    # padding gives the start of a term more weight, like pg_trgm
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Terms by the trigrams they contain, similar terms are collected from the postings of the query's trigrams"""
+    def __init__(self, terms: Iterable[str]):
+        self.terms = sorted(set(terms))
+        self.trigram_counts = array.array("l")
+        self.postings: dict[str, list[int]] = defaultdict(list)  # trigram -> term ids
+
+        for term_id, term in enumerate(self.terms):
+            term_trigrams = trigrams(term)
+            self.trigram_counts.append(len(term_trigrams))
+
+            for trigram in term_trigrams:
+                self.postings[trigram].append(term_id)
+
+    def has_prefix(self, prefix: str) -> bool:
+        position = bisect.bisect_left(self.terms, prefix)
+        return position < len(self.terms) and self.terms[position].startswith(prefix)
+
+    def similar(self, term: str, limit: int = 3, threshold: float = 0.3) -> list[str]:
+        """Returns up to limit terms ranked by the share of trigrams they have in common with term"""
+        term_trigrams = trigrams(term)
+
+        shared_counts = Counter()
+        for trigram in term_trigrams:
+            shared_counts.update(self.postings.get(trigram, ()))
+
+        similarities = ((shared / (len(term_trigrams) + self.trigram_counts[term_id] - shared), term_id)
+                        for term_id, shared in shared_counts.items())
+        best = heapq.nlargest(limit, (similarity for similarity in similarities if similarity[0] >= threshold))
+
+        return [self.terms[term_id] for _, term_id in best]
+
+
+class FuzzyIndex:
+    """
+    Trigram indexes over the artist names and the words of map titles and artist names, used for "did you mean"
+    suggestions of searches without results. Loaded on first use and again after maps or artists changed.
+    """
+    def __init__(self):
+        self.artists = TrigramIndex([])  # by name key
+        self.artist_names: dict[str, str] = {}  # name key -> name
+        self.words = TrigramIndex([])
+        self.generation = 0
+        self.loaded_generation = -1
+        self.lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.generation += 1
+
+    async def ensure_loaded(self):
+        if self.loaded_generation != self.generation:
+            async with self.lock:
+                if self.loaded_generation != self.generation:
+                    await self.refresh()
+
+    @staticmethod
+    def build(artist_names: list[str], map_names: list[str]) -> tuple[dict[str, str], TrigramIndex, TrigramIndex]:
+        names_by_key = {artist_name_key(name): name for name in artist_names}
+        words = TrigramIndex(word for name in itertools.chain(map_names, artist_names)
+                             for word in WORD_PATTERN.findall(name.casefold()))
+
+        return names_by_key, TrigramIndex(names_by_key.keys()), words
+
+    async def refresh(self):
+        generation = self.generation
+
+        async with Session(read_only=True) as db:
+            artist_names = (await db.session.execute(
+                select(MapArtArtist.name).where(MapArtArtist.artist_id.in_(select(artist_mapart.c.artist_id))))).scalars().all()
+            # read in partitions, so the bot keeps running in between
+            map_names = []
+            async for names in (await db.session.stream_scalars(select(MapArtArchiveDBEntry.name))).partitions(5000):
+                map_names.extend(names)
+
+        # building the indexes takes about a second for large archives, the bot keeps running while a thread does it
+        self.artist_names, self.artists, self.words = await asyncio.to_thread(self.build, artist_names, map_names)
+        self.loaded_generation = generation
+        logger.info(f"indexed {len(self.artists.terms)} artist names and {len(self.words.terms)} words for fuzzy matching")
+
+    async def suggest_artists(self, name: str, limit: int = 3) -> list[str]:
+        """Returns artist names similar to name, nothing if an artist has that name"""
+        await self.ensure_loaded()
+
+        name_key = artist_name_key(name)
+        if name_key in self.artist_names:
+            return []
+
+        return [self.artist_names[similar_key] for similar_key in self.artists.similar(name_key, limit)]
+
+    async def suggest_keyword(self, keyword: str) -> str | None:
+        """Returns the keyword with every word that no title or artist name starts with replaced by the most similar word"""
+        await self.ensure_loaded()
+
+        words = WORD_PATTERN.findall(keyword.casefold())
+        suggested_words = []
+
+        for word in words:
+            if self.words.has_prefix(word):
+                suggested_words.append(word)
+            elif similar_words := self.words.similar(word, limit=1):
+                suggested_words.append(similar_words[0])
+            else:
+                return None
+
+        return " ".join(suggested_words) if suggested_words != words else None
+
+
+fuzzy_index = FuzzyIndex()
+
+
+# pragmas applied to every new connection, selected with config.storage_profile
+STORAGE_PROFILES = {
+    # sqlite's defaults
+    "default": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,  # negative values are in KiB
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,
+    },
+    # readers and the writer don't block each other, a crash can only lose the last commits, not corrupt the database
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+
+def apply_storage_profile(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+
+    for pragma, value in STORAGE_PROFILES[config.storage_profile].items():
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+
+    cursor.close()
+
+
+def begin_read_transaction(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+def set_read_only(dbapi_connection, connection_record):
+    # let BEGIN be emitted by begin_read_transaction, the driver only opens transactions before writes
+    dbapi_connection.isolation_level = None
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+
+async def load_maps(session: sqlalchemy.ext.asyncio.AsyncSession, map_ids: list[int]) -> list[MapArtArchiveEntry]:
+    """Loads maps by id in the given order, ids of deleted maps are skipped"""
+    entries = {}
+    for batch in itertools.batched(map_ids, ADD_MAPS_BATCH_SIZE):
+        query = select(*ENTRY_COLUMNS).where(MapArtArchiveDBEntry.map_id.in_(batch))
+        entries |= {row.map_id: entry_from_row(row) for row in await session.execute(query)}
+
+    return [entries[map_id] for map_id in map_ids if map_id in entries]
+
 
 class Session:
-    engine = create_async_engine("sqlite+aiosqlite:///map_art.db")
+    # bumped after every commit that added or deleted maps, cached search results are only valid for one generation
+    maps_generation = 0
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{config.db_path}")
+    event.listen(engine.sync_engine, "connect", apply_storage_profile)
     session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+    # separate connection pool for read only sessions, with WAL these never wait for a write to finish
+    reader_engine = create_async_engine(f"sqlite+aiosqlite:///{config.db_path}")
+    event.listen(reader_engine.sync_engine, "connect", apply_storage_profile)
+    event.listen(reader_engine.sync_engine, "connect", set_read_only)
+    event.listen(reader_engine.sync_engine, "begin", begin_read_transaction)
+    reader_session_maker = async_sessionmaker(reader_engine, expire_on_commit=False)
+
+    def __init__(self, read_only: bool = False):
+        """read_only sessions read from one consistent snapshot and can't write"""
+        self.read_only = read_only
+
     async def __aenter__(self):
-        self.session = Session.session_maker()
+        self.session = Session.reader_session_maker() if self.read_only else Session.session_maker()
+        self.maps_changed = False
+        self.artists_changed = False
+        self.changed_map_ids: set[int] = set()
 
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.session.commit()
+        if self.read_only:
+            # a rollback expires every loaded instance, detached first they keep their values for the caller
+            self.session.expunge_all()
+            await self.session.rollback()
+        else:
+            await self.session.commit()
+
         await self.session.close()
 
+        if self.maps_changed:
+            map_id_sampler.invalidate()
+
+            if config.search_index:
+                await archive_index.refresh(self.changed_map_ids)
+
+            # only bumped once the index is refreshed, searches cached under the new generation can't be stale
+            Session.maps_generation += 1
+
+        if self.maps_changed or self.artists_changed:
+            artist_name_index.invalidate()
+            fuzzy_index.invalidate()
+
     def get_query_builder(self) -> 'MapArtQueryBuilder':
         return MapArtQueryBuilder(self.session)
 
+    def get_indexed_query_builder(self) -> 'IndexedQueryBuilder':
+        return IndexedQueryBuilder(self.session, archive_index)
+
+    async def get_maps(self, map_ids: list[int]) -> list[MapArtArchiveEntry]:
+        return await load_maps(self.session, map_ids)
+
     async def get_latest_create_date(self) -> datetime.datetime:
         query = select(func.max(MapArtArchiveDBEntry.create_date))
         date = (await self.session.execute(query)).scalar()
         return date.replace(tzinfo=datetime.UTC) if date is not None else datetime.datetime(2015, 1, 1, 0, 0, tzinfo=datetime.UTC)
 
     async def add_maps(self, maps: Iterable[MapArtArchiveEntry]):
-        all_artist_names = set()
+        maps = list(maps)
+        self.maps_changed = True
 
+        # artist names are cleaned on write, so reads can use them as they are
         for map_entry in maps:
-            all_artist_names.update(map_entry.artists)
+            map_entry.artists = [name for name in map(clean_artist_name, map_entry.artists) if name]
+
+        # artist name key -> first spelling of the name
+        all_artist_names: dict[str, str] = {}
+
+        for map_entry in maps:
+            for name in map_entry.artists:
+                all_artist_names.setdefault(artist_name_key(name), name)
 
         existing_artists_query = await self.session.execute(
-            select(MapArtArtist).where(MapArtArtist.name.in_(all_artist_names)))
-        existing_artists = {artist.name: artist for artist in existing_artists_query.scalars()}
+            select(MapArtArtist).where(MapArtArtist.name_key.in_(all_artist_names.keys())))
+        existing_artists = {artist.name_key: artist for artist in existing_artists_query.scalars()}
 
-        new_artist_names = all_artist_names - set(existing_artists.keys())
-        new_artists = [MapArtArtist(name=name) for name in new_artist_names]
+        new_artists = [MapArtArtist(name=name, name_key=name_key) for name_key, name in all_artist_names.items()
+                       if name_key not in existing_artists]
         self.session.add_all(new_artists)
         await self.session.flush()  # Populate IDs for new artists
 
         artist_map = existing_artists
         for artist in new_artists:
-            artist_map[artist.name] = artist
-
-        maps_to_create = []
-        for map_entry in maps:
-            artist_entities = [artist_map[name] for name in map_entry.artists]
-
-            if map_entry.map_id is not None:
-                select_query = select(MapArtArchiveDBEntry).where(MapArtArchiveDBEntry.map_id == map_entry.map_id)
-                db_entry = (await self.session.execute(select_query)).scalars().first()
-
-                db_entry.width = map_entry.width
-                db_entry.height = map_entry.height
-                db_entry.type = map_entry.map_type
-                db_entry.palette = map_entry.palette
-                db_entry.name = map_entry.name
-                db_entry.artists = artist_entities
-                db_entry.notes = map_entry.notes
-                db_entry.image_url = map_entry.image_url
-                db_entry.create_date = map_entry.create_date
-                db_entry.author_id = map_entry.author_id
-                db_entry.message_id = map_entry.message_id
-                db_entry.flagged = map_entry.flagged
-
-                logger.info(f"updated map with id {map_entry.map_id}")
-            else:
-                maps_to_create.append(MapArtArchiveDBEntry(
-                    width=map_entry.width,
-                    height=map_entry.height,
-                    type=map_entry.map_type,
-                    palette=map_entry.palette,
-                    name=map_entry.name,
-                    artists=artist_entities,
-                    notes=map_entry.notes,
-                    image_url=map_entry.image_url,
-                    create_date=map_entry.create_date,
-                    author_id=map_entry.author_id,
-                    message_id=map_entry.message_id,
-                    flagged=map_entry.flagged
-                ))
-
-        if len(maps_to_create) > 0:
-            self.session.add_all(maps_to_create)
-            logger.info(f"added {len(new_artists)} artists and {len(maps_to_create)} maps")
-
-        await self.session.flush()
+            artist_map[artist.name_key] = artist
+
+        for batch in itertools.batched(maps, ADD_MAPS_BATCH_SIZE):
+            start_time = time.perf_counter()
+
+            map_artists = [[artist_map[name_key] for name_key in dict.fromkeys(map(artist_name_key, map_entry.artists))]
+                           for map_entry in batch]
+
+            rows = [{
+                "map_id": map_entry.map_id,
+                "width": map_entry.width,
+                "height": map_entry.height,
+                "type": map_entry.map_type,
+                "palette": map_entry.palette,
+                "name": map_entry.name,
+                "notes": map_entry.notes,
+                "image_url": map_entry.image_url,
+                "create_date": map_entry.create_date,
+                "author_id": map_entry.author_id,
+                "message_id": map_entry.message_id,
+                "flagged": map_entry.flagged,
+            } for map_entry in batch]
+
+            # maps with an id are updated in place, their ids are known so nothing needs to be returned
+            updated_rows = [row for row in rows if row["map_id"] is not None]
+            if len(updated_rows) > 0:
+                upsert_query = sqlite_insert(MapArtArchiveDBEntry.__table__)
+                upsert_query = upsert_query.on_conflict_do_update(
+                    index_elements=[MapArtArchiveDBEntry.map_id],
+                    set_={column: upsert_query.excluded[column] for column in MAP_COLUMNS if column != "map_id"},
+                )
+                await self.session.execute(upsert_query, updated_rows)
+
+            # maps without an id get a new one. sort_by_parameter_order would insert them one by one, as map_id can't be
+            # used as a sentinel on sqlite. sqlite hands out new ids in ascending order within a statement though, so
+            # the sorted ids are in the order of the rows.
+            new_rows = [{column: value for column, value in row.items() if column != "map_id"}
+                        for row in rows if row["map_id"] is None]
+            new_map_ids = []
+            if len(new_rows) > 0:
+                insert_query = insert(MapArtArchiveDBEntry.__table__).returning(MapArtArchiveDBEntry.map_id)
+                new_map_ids = sorted((await self.session.execute(insert_query, new_rows)).scalars())
+
+            new_map_id_iter = iter(new_map_ids)
+            map_ids = [map_entry.map_id if map_entry.map_id is not None else next(new_map_id_iter)
+                       for map_entry in batch]
+            self.changed_map_ids.update(map_ids)
+
+            # the association table has a composite primary key, so every artist may only appear once per map
+            await self.session.execute(delete(artist_mapart).where(artist_mapart.c.map_id.in_(map_ids)))
+            association_rows = [{"map_id": map_id, "artist_id": artist.artist_id, "position": position}
+                                for map_id, artists in zip(map_ids, map_artists)
+                                for position, artist in enumerate(artists)]
+            if len(association_rows) > 0:
+                await self.session.execute(insert(artist_mapart), association_rows)
+
+            await self.update_search_index([{
+                "rowid": map_id,
+                "name": map_entry.name,
+                "notes": map_entry.notes,
+                "artists": " ".join(artist.name for artist in artists),
+            } for map_id, map_entry, artists in zip(map_ids, batch, map_artists)])
+
+            updated_count = sum(1 for map_entry in batch if map_entry.map_id is not None)
+            logger.info(f"added {len(batch) - updated_count} and updated {updated_count} maps "
+                        f"in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+        if len(new_artists) > 0:
+            logger.info(f"added {len(new_artists)} artists")
+
+    async def update_search_index(self, fts_rows: list[dict]):
+        if len(fts_rows) == 0:
+            return
+
+        await self.session.execute(delete(map_art_fts).where(map_art_fts.c.rowid.in_([row["rowid"] for row in fts_rows])))
+        await self.session.execute(insert(map_art_fts), fts_rows)
 
     async def delete_maps(self, maps: Iterable[MapArtArchiveEntry]):
         map_ids_to_delete = [entry.map_id for entry in maps]
+        self.maps_changed = True
+        self.changed_map_ids.update(map_ids_to_delete)
 
-        db_entries = (await self.session.execute(select(MapArtArchiveDBEntry).where(MapArtArchiveDBEntry.map_id.in_(map_ids_to_delete)))).scalars().all()
-
-        for db_entry in db_entries:
-            await self.session.delete(db_entry)
+        await self.session.execute(delete(artist_mapart).where(artist_mapart.c.map_id.in_(map_ids_to_delete)))
+        await self.session.execute(
+            delete(MapArtArchiveDBEntry).where(MapArtArchiveDBEntry.map_id.in_(map_ids_to_delete)),
+            execution_options={"synchronize_session": False})
+        await self.session.execute(delete(map_art_fts).where(map_art_fts.c.rowid.in_(map_ids_to_delete)))
 
-    async def get_random_map(self) -> MapArtArchiveEntry:
-        query = select(MapArtArchiveDBEntry).order_by(func.random()).limit(1)
-        entry = (await self.session.execute(query)).scalars().first()
-        return entry.as_entry() if entry is not None else None
-    
-    async def roll_gamble(self, search_query: Select[tuple[MapArtArchiveDBEntry]]) -> tuple[int, int, bool, MapArtArchiveDBEntry]:
-        map_ids_subquery = search_query.with_only_columns(MapArtArchiveDBEntry.map_id).subquery()
-        total_map_count_query = select(func.count()).select_from(MapArtArchiveDBEntry).scalar_subquery()
-        search_map_count_query = select(func.count()).select_from(map_ids_subquery).scalar_subquery()
+    async def run_maintenance(self) -> int:
+        """Removes artists without any maps and updates the query planner statistics, returns the removed artist count"""
+        orphan_artists = await self.session.execute(
+            delete(MapArtArtist).where(MapArtArtist.artist_id.notin_(select(artist_mapart.c.artist_id))),
+            execution_options={"synchronize_session": False})
 
-        random_map = await self.get_random_map()
+        await self.session.execute(text("ANALYZE"))
+        await self.session.execute(text("PRAGMA optimize"))
 
-        win_query = select(map_ids_subquery).where(map_ids_subquery.c.map_id == random_map.map_id).exists()
+        return orphan_artists.rowcount
 
-        combined = select(total_map_count_query, search_map_count_query, win_query)
+    async def set_artist_name(self, name: str):
+        """Changes how an artist name is spelled, e.g. its capitalization"""
+        name = clean_artist_name(name)
+        self.artists_changed = True
+        await self.session.execute(
+            update(MapArtArtist).where(MapArtArtist.name_key == artist_name_key(name)).values(name=name))
 
-        total_count, win_count, win = (await self.session.execute(combined)).one()
+    async def get_random_map(self) -> MapArtArchiveEntry:
+        map_id = await map_id_sampler.pick(self.session)
+        if map_id is None:
+            return None
 
-        return (total_count, win_count, win, random_map)
+        entries = await self.get_maps([map_id])
+        return entries[0] if len(entries) > 0 else None
+    
+    async def get_map_count(self) -> int:
+        return await map_id_sampler.count(self.session)
 
     async def get_balance(self, user_id: int) -> Balance:
-        query = select(Balance).where(Balance.discord_id.is_(user_id))
+        query = select(Balance).where(Balance.discord_id == user_id)
         entry = (await self.session.execute(query)).scalars().first()
 
         if entry is not None:
             return entry
-        
-        instance = Balance()
-        instance.discord_id = user_id
-        self.session.add(instance)
-        entry = (await self.session.execute(query)).scalars().first()
-        return entry
 
-    async def add_balance(self, user_id: int, amount: int) -> Balance:
-        entry = await self.get_balance(user_id)
-        
-        entry.balance += amount
-        return entry
+        # balances are only stored once they change
+        return Balance(discord_id=user_id, balance=STARTING_BALANCE, total_bets=0)
 
-    async def reset_gambler(self, user_id: int) -> Balance:
-        entry = await self.get_balance(user_id)
+    async def apply_balance_changes(self, changes: dict[int, tuple[int, int]]):
+        """Applies queued (amount, bet) changes per user id in one statement, used by the balance ledger"""
+        query = sqlite_insert(Balance).values(
+            discord_id=bindparam("user_id"),
+            balance=STARTING_BALANCE + bindparam("amount"),
+            total_bets=bindparam("bet"),
+        )
+        query = query.on_conflict_do_update(
+            index_elements=[Balance.discord_id],
+            set_={"balance": Balance.balance + bindparam("amount"), "total_bets": Balance.total_bets + bindparam("bet")},
+        )
 
-        entry.balance = 0
-        entry.total_bets = 0
-        return entry
+        await self.session.execute(query, [{"user_id": user_id, "amount": amount, "bet": bet}
+                                           for user_id, (amount, bet) in changes.items()])
 
-    async def update_balance(self, user_id: int, won: bool, bet: int, bet_winnings: int) -> Balance:
-        entry = await self.get_balance(user_id)
+    async def reset_gambler(self, user_id: int) -> Balance:
+        query = sqlite_insert(Balance).values(discord_id=user_id, balance=0, total_bets=0)
+        query = query.on_conflict_do_update(
+            index_elements=[Balance.discord_id],
+            set_={"balance": 0, "total_bets": 0},
+        ).returning(Balance)
 
-        if won:
-            entry.balance += bet_winnings - bet
-        else:
-            entry.balance -= bet
-        
-        entry.total_bets += bet
-        return entry
+        return (await self.session.scalars(query, execution_options={"populate_existing": True})).one()
 
     async def get_leaderboard(self, limit: int = 10) -> tuple[list[Balance], list[Balance]]:
         top_bals_query = select(Balance).order_by(desc(Balance.balance)).limit(limit)
@@ -250,31 +996,87 @@ class Session:
         return top_bals, top_bets
 
 
+def seek_after(sort_keys: list[tuple[ColumnElement, bool]], values: tuple) -> ColumnElement[bool]:
+    """Builds the predicate for all rows sorted after the given sort key values"""
+    (first_column, first_ascending), *_ = sort_keys
+
+    after_clauses = []
+    for i, ((column, ascending), value) in enumerate(zip(sort_keys, values)):
+        equal_prefix = [prev_column == prev_value for (prev_column, _), prev_value in zip(sort_keys[:i], values[:i])]
+        after_clauses.append(and_(*equal_prefix, column > value if ascending else column < value))
+
+    # the redundant bound on the first column lets sqlite turn the seek into an index range scan
+    first_bound = first_column >= values[0] if first_ascending else first_column <= values[0]
+
+    return and_(first_bound, or_(*after_clauses))
+
+
+# text sqlite converts to a number when comparing it with an integer column, with some room to spare
+NUMERIC_PATTERN = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*")
+
+
+def like_matches(pattern: str, value: str) -> bool:
+    """Evaluates sqlite's LIKE without escape character, which only ignores the case of ASCII letters"""
+    regex = "".join(".*" if char == "%" else "." if char == "_" else re.escape(char) for char in pattern)
+    return re.fullmatch(regex, value, re.IGNORECASE | re.ASCII | re.DOTALL) is not None
+
+
 class MapArtQueryBuilder:
     def __init__(self, session):
         self.session: sqlalchemy.ext.asyncio.AsyncSession = session
         self.query: Select[tuple[MapArtArchiveDBEntry]] = select(MapArtArchiveDBEntry)
-
-    def order_by(self, field: Literal["size", "date"], reverse: bool = False):
+        self.seek: ColumnElement[bool] | None = None
+        self.reverse_results: bool = False
+
+    def order_by(self, field: Literal["size", "date"], reverse: bool = False,
+                 after: tuple | None = None, before: tuple | None = None):
+        """
+        Orders the query, map_id is always used as the last sort key so the order is stable.
+
+        after / before are keyset cursors, the sort key values of the last / first entry of the neighbouring page,
+        (area, create_date, map_id) when ordering by size and (create_date, map_id) when ordering by date.
+        """
+        # (column, ascending) pairs
         if field == "size":
-            if not reverse:
-                self.query = self.query.order_by(desc(MapArtArchiveDBEntry.width * MapArtArchiveDBEntry.height), asc(MapArtArchiveDBEntry.create_date))
-            else:
-                self.query = self.query.order_by(asc(MapArtArchiveDBEntry.width * MapArtArchiveDBEntry.height), desc(MapArtArchiveDBEntry.create_date))
+            sort_keys = [
+                (MapArtArchiveDBEntry.area, reverse),
+                (MapArtArchiveDBEntry.create_date, not reverse),
+                (MapArtArchiveDBEntry.map_id, not reverse),
+            ]
         elif field == "date":
-            if not reverse:
-                self.query = self.query.order_by(asc(MapArtArchiveDBEntry.create_date))
-            else:
-                self.query = self.query.order_by(desc(MapArtArchiveDBEntry.create_date))
+            sort_keys = [
+                (MapArtArchiveDBEntry.create_date, not reverse),
+                (MapArtArchiveDBEntry.map_id, not reverse),
+            ]
+        else:
+            return
+
+        cursor = after
+        if before is not None:
+            # walk backwards from the cursor, execute() restores the original order
+            sort_keys = [(column, not ascending) for column, ascending in sort_keys]
+            cursor = before
+            self.reverse_results = True
+
+        self.query = self.query.order_by(*[asc(column) if ascending else desc(column) for column, ascending in sort_keys])
+
+        if cursor is not None:
+            if len(cursor) != len(sort_keys):
+                raise ValueError("cursor doesn't match the search order")
+
+            self.seek = seek_after(sort_keys, cursor)
 
     def add_size_filter(self, min_size: int | None=None, max_size: int | None=None, exact_size: tuple[int, int] | None=None):
-        if min_size is not None:
-            self.query = self.query.where(MapArtArchiveDBEntry.width * MapArtArchiveDBEntry.height >= min_size)
+        # every map art has at least one map, a smaller minimum would only steer sqlite towards a useless index scan
+        if min_size is not None and min_size > 1:
+            self.query = self.query.where(MapArtArchiveDBEntry.area >= min_size)
         if max_size is not None:
-            self.query = self.query.where(MapArtArchiveDBEntry.width * MapArtArchiveDBEntry.height <= max_size)
+            self.query = self.query.where(MapArtArchiveDBEntry.area <= max_size)
         if exact_size is not None:
             width, height = exact_size
-            self.query = self.query.where(and_(MapArtArchiveDBEntry.width == width, MapArtArchiveDBEntry.height == height))
+            # the area condition lets sqlite use the area index
+            self.query = self.query.where(and_(MapArtArchiveDBEntry.area == width * height,
+                                               MapArtArchiveDBEntry.width == width, MapArtArchiveDBEntry.height == height))
 
     def add_type_filter(self, include: list[MapArtArchiveEntry]=None, exclude: list[MapArtArchiveEntry]=None):
         if include is not None and len(include) >= 1:
@@ -289,10 +1091,23 @@ class MapArtQueryBuilder:
             self.query = self.query.where(MapArtArchiveDBEntry.palette.notin_(exclude))
 
     def add_artist_filter(self, include: list[str]=None, exclude: list[str]=None):
+        # artists are resolved through the unique name_key index, the maps with one semi-join on artist_mapart
         if include is not None and len(include) >= 1:
-            self.query = self.query.where(and_(*[MapArtArchiveDBEntry.artists.any(MapArtArtist.name.ilike(name)) for name in include]))
+            name_keys = set(map(artist_name_key, include))
+            artist_ids = select(MapArtArtist.artist_id).where(MapArtArtist.name_key.in_(name_keys))
+
+            # the maps need to have every included artist
+            map_ids = (select(artist_mapart.c.map_id)
+                       .where(artist_mapart.c.artist_id.in_(artist_ids))
+                       .group_by(artist_mapart.c.map_id)
+                       .having(func.count() == len(name_keys)))
+            self.query = self.query.where(MapArtArchiveDBEntry.map_id.in_(map_ids))
         if exclude is not None and len(exclude) >= 1:
-            self.query = self.query.where(and_(*[not_(MapArtArchiveDBEntry.artists.any(MapArtArtist.name.ilike(name))) for name in exclude]))
+            name_keys = set(map(artist_name_key, exclude))
+            artist_ids = select(MapArtArtist.artist_id).where(MapArtArtist.name_key.in_(name_keys))
+
+            map_ids = select(artist_mapart.c.map_id).where(artist_mapart.c.artist_id.in_(artist_ids))
+            self.query = self.query.where(MapArtArchiveDBEntry.map_id.notin_(map_ids))
 
     def add_duplicate_filter(self):
         self.query = self.query.where(MapArtArchiveDBEntry.message_id.in_(select(MapArtArchiveDBEntry.message_id).group_by(MapArtArchiveDBEntry.message_id).having(func.count() >= 2)))
@@ -300,33 +1115,243 @@ class MapArtQueryBuilder:
     def add_no_img_filter(self):
         self.query = self.query.where(MapArtArchiveDBEntry.image_url.in_([None, ""]))
 
+    def add_message_id_filter(self, message_ids: list[int]):
+        # equality on the indexed column, every message id has to match like every keyword does
+        for message_id in set(message_ids):
+            self.query = self.query.where(MapArtArchiveDBEntry.message_id == message_id)
+
     def add_search_filter(self, include=None, exclude=None):
-        if include is not None and len(include) >= 1:
-            for search_term in include:
-                self.query = (self.query
-                .join(MapArtArchiveDBEntry.artists, isouter=True)
-                .where(or_(
+        predicate_count = 0
+
+        def search_term_matches(search_term: str):
+            nonlocal predicate_count
+
+            if re.search(r"\w", search_term):
+                # prefix query for the whole term, quotes in the term are escaped by doubling them
+                fts_query = '"' + search_term.replace('"', '""') + '"*'
+                text_matches = MapArtArchiveDBEntry.map_id.in_(
+                    select(map_art_fts.c.rowid).where(map_art_fts.c.map_art_fts.match(fts_query)))
+            else:
+                # the tokenizer drops terms without any word characters, e.g. "!!", fall back to a substring search
+                text_matches = or_(
                     MapArtArchiveDBEntry.name.contains(search_term),
-                    MapArtArtist.name.ilike(search_term),
-                    MapArtArchiveDBEntry.palette.ilike(search_term),
-                    MapArtArchiveDBEntry.type.ilike(search_term),
-                    MapArtArchiveDBEntry.message_id == search_term,
                     MapArtArchiveDBEntry.notes.contains(search_term),
-                )))
+                )
+
+            # the type, palette and message id predicates are only added if the term can match them at all
+            predicates = [text_matches]
+
+            if map_types := [map_type for map_type in MapArtType if like_matches(search_term, map_type.name)]:
+                predicates.append(MapArtArchiveDBEntry.type.in_(map_types))
+            if palettes := [palette for palette in MapArtPalette if like_matches(search_term, palette.name)]:
+                predicates.append(MapArtArchiveDBEntry.palette.in_(palettes))
+            if NUMERIC_PATTERN.fullmatch(search_term):
+                predicates.append(MapArtArchiveDBEntry.message_id == search_term)
+
+            predicate_count += len(predicates)
+            return or_(*predicates)
+
+        # name, notes and artist names are matched through the full-text index, see map_art_fts
+        if include is not None and len(include) >= 1:
+            for search_term in include:
+                self.query = self.query.where(search_term_matches(search_term))
 
         if exclude is not None and len(exclude) >= 1:
             for search_term in exclude:
-                self.query = (self.query
-                .join(MapArtArchiveDBEntry.artists, isouter=True)
-                .where(not_(or_(
-                    MapArtArchiveDBEntry.name.contains(search_term),
-                    MapArtArtist.name.ilike(search_term),
-                    MapArtArchiveDBEntry.palette.ilike(search_term),
-                    MapArtArchiveDBEntry.type.ilike(search_term),
-                    MapArtArchiveDBEntry.message_id == search_term,
-                    MapArtArchiveDBEntry.notes.contains(search_term),
-                ))))
+                self.query = self.query.where(not_(search_term_matches(search_term)))
+
+        if predicate_count > 0:
+            logger.debug(f"keyword filter with {len(include or []) + len(exclude or [])} terms uses {predicate_count} predicates")
+
+    async def count(self) -> int:
+        # every filter is a semi-join, so counting the filtered map table counts every map once
+        count_query = self.query.order_by(None).with_only_columns(func.count()).select_from(MapArtArchiveDBEntry)
+        return (await self.session.execute(count_query)).scalar()
+
+    async def exists(self) -> bool:
+        exists_query = select(self.query.order_by(None).with_only_columns(MapArtArchiveDBEntry.map_id).exists())
+        return (await self.session.execute(exists_query)).scalar()
+
+    async def count_and_match(self, map_id: int) -> tuple[int, bool]:
+        """Counts the matching maps and checks whether the given map matches in the same pass"""
+        win_query = self.query.order_by(None).with_only_columns(
+            func.count(), func.coalesce(func.max(MapArtArchiveDBEntry.map_id == map_id), False)
+        ).select_from(MapArtArchiveDBEntry)
+
+        count, match = (await self.session.execute(win_query)).one()
+        return count, bool(match)
+
+    async def execute(self, limit: int | None = None, offset: int = 0) -> list[MapArtArchiveEntry]:
+        query = self.query.with_only_columns(*ENTRY_COLUMNS)
+        if self.seek is not None:
+            query = query.where(self.seek)
+        if limit is not None or offset > 0:
+            query = query.limit(limit).offset(offset)
+
+        entries = [entry_from_row(row) for row in await self.session.execute(query)]
+        if self.reverse_results:
+            entries.reverse()
+
+        return entries
+
+    async def execute_ids(self, limit: int | None = None, offset: int = 0) -> list[int]:
+        """Same as execute, but only returns the map ids"""
+        query = self.query.with_only_columns(MapArtArchiveDBEntry.map_id)
+        if self.seek is not None:
+            query = query.where(self.seek)
+        if limit is not None or offset > 0:
+            query = query.limit(limit).offset(offset)
+
+        map_ids = list((await self.session.execute(query)).scalars())
+        if self.reverse_results:
+            map_ids.reverse()
+
+        return map_ids
+
+
+class IndexedQueryBuilder:
+    """Evaluates the filters of MapArtQueryBuilder on the archive index, keyword, duplicate and image filters are not supported"""
+    def __init__(self, session, index: ArchiveIndex):
+        self.session: sqlalchemy.ext.asyncio.AsyncSession = session
+        self.index = index
+
+        # (kind, values) pairs, included maps need to have any of the values, excluded maps none of them
+        self.included: list[tuple[str, list]] = []
+        self.excluded: list[tuple[str, list]] = []
+        self.min_area: int | None = None
+        self.max_area: int | None = None
+
+        self.sort_field: Literal["size", "date"] = "date"
+        self.descending = False
+        self.cursor: tuple | None = None
+        self.reverse_results = False
+
+    def order_by(self, field: Literal["size", "date"], reverse: bool = False,
+                 after: tuple | None = None, before: tuple | None = None):
+        """Same order and cursors as MapArtQueryBuilder.order_by"""
+        if field not in self.index.sort_keys:
+            return
+
+        self.sort_field = field
+        # the size sort key uses the negative area, so both orders are descending when reversed
+        self.descending = reverse
+
+        cursor = after
+        if before is not None:
+            self.descending = not self.descending
+            cursor = before
+            self.reverse_results = True
+
+        if cursor is not None:
+            if len(cursor) != (3 if field == "size" else 2):
+                raise ValueError("cursor doesn't match the search order")
+
+            *area, create_date, map_id = cursor
+            self.cursor = (*(-value for value in area), index_timestamp(create_date), map_id)
+
+    def add_size_filter(self, min_size: int | None=None, max_size: int | None=None, exact_size: tuple[int, int] | None=None):
+        if min_size is not None and min_size > 1:
+            self.min_area = min_size
+        if max_size is not None:
+            self.max_area = max_size
+        if exact_size is not None:
+            self.included.append(("size", [exact_size]))
+
+    def add_type_filter(self, include: list[MapArtType]=None, exclude: list[MapArtType]=None):
+        if include is not None and len(include) >= 1:
+            self.included.append(("type", include))
+        if exclude is not None and len(exclude) >= 1:
+            self.excluded.append(("type", exclude))
+
+    def add_palette_filter(self, include: list[MapArtPalette]=None, exclude: list[MapArtPalette]=None):
+        if include is not None and len(include) >= 1:
+            self.included.append(("palette", include))
+        if exclude is not None and len(exclude) >= 1:
+            self.excluded.append(("palette", exclude))
+
+    def add_artist_filter(self, include: list[str]=None, exclude: list[str]=None):
+        if include is not None and len(include) >= 1:
+            # the maps need to have every included artist
+            for name_key in set(map(artist_name_key, include)):
+                self.included.append(("artist", [name_key]))
+        if exclude is not None and len(exclude) >= 1:
+            self.excluded.append(("artist", list(map(artist_name_key, exclude))))
+
+    def add_search_filter(self, include=None, exclude=None):
+        if include or exclude:
+            raise ValueError("keyword search is not supported by the archive index")
+
+    def add_message_id_filter(self, message_ids: list[int]):
+        if message_ids:
+            raise ValueError("message id lookups are not supported by the archive index")
+
+    def mask(self) -> int:
+        mask = self.index.bitset("live", None)
+
+        for kind, values in self.included:
+            mask &= self.index.union(kind, values)
+        for kind, values in self.excluded:
+            mask &= ~self.index.union(kind, values)
+
+        if self.min_area is not None or self.max_area is not None:
+            min_area = self.min_area if self.min_area is not None else 0
+            max_area = self.max_area if self.max_area is not None else float("inf")
+            mask &= self.index.union("area", [area for area in self.index.bitsets["area"] if min_area <= area <= max_area])
+
+        return mask
+
+    async def count(self) -> int:
+        await self.index.ensure_loaded()
+
+        return self.mask().bit_count()
+
+    async def exists(self) -> bool:
+        await self.index.ensure_loaded()
+
+        return self.mask() != 0
+
+    async def count_and_match(self, map_id: int) -> tuple[int, bool]:
+        await self.index.ensure_loaded()
+
+        mask = self.mask()
+        slot = self.index.slots.get(map_id)
+
+        return mask.bit_count(), slot is not None and bool(mask >> slot & 1)
+
+    async def execute(self, limit: int | None = None, offset: int = 0) -> list[MapArtArchiveEntry]:
+        # only the maps of the page are loaded from the database
+        return await load_maps(self.session, await self.execute_ids(limit=limit, offset=offset))
+
+    async def execute_ids(self, limit: int | None = None, offset: int = 0) -> list[int]:
+        await self.index.ensure_loaded()
+
+        sort_keys = self.index.sort_keys[self.sort_field]
+        order = self.index.order(self.sort_field)
+        mask = self.mask()
+        flags = bitset_to_flags(mask, len(sort_keys))
+
+        if mask.bit_count() * 16 < len(order):
+            # only a few maps match, sorting them is cheaper than walking the whole order
+            matching_slots = sorted(itertools.compress(itertools.count(), flags),
+                                    key=sort_keys.__getitem__, reverse=self.descending)
+            if self.cursor is not None:
+                matching_slots = [slot for slot in matching_slots
+                                  if (sort_keys[slot] < self.cursor if self.descending else sort_keys[slot] > self.cursor)]
+        else:
+            # positions in the order to walk, starting next to the cursor
+            if self.descending:
+                end = len(order) if self.cursor is None else bisect.bisect_left(order, self.cursor, key=sort_keys.__getitem__)
+                positions = range(end - 1, -1, -1)
+            else:
+                start = 0 if self.cursor is None else bisect.bisect_right(order, self.cursor, key=sort_keys.__getitem__)
+                positions = range(start, len(order))
+
+            matching_slots = filter(flags.__getitem__, map(order.__getitem__, positions))
+
+        slots = list(itertools.islice(matching_slots, offset, None if limit is None else offset + limit))
+
+        if self.reverse_results:
+            slots.reverse()
 
-    async def execute(self):
-        db_entries = (await self.session.execute(self.query)).scalars().unique().all()
-        return [entry.as_entry() for entry in db_entries]
+        # the map id is the last sort key
+        return [sort_keys[slot][-1] for slot in slots]
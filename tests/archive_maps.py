@@ -0,0 +1,31 @@
+import datetime
+import random
+
+from map_archive_entry import MapArtArchiveEntry, MapArtType, MapArtPalette
+
+# synthetic maps shared by the tests and the benchmarks, unlike conftest importing this doesn't set up a database
+WORDS = "miku sunset castle dragon ocean forest pixel anime cat dog flag portrait logo space".split()
+
+
+def make_maps(count: int, seed: int = 1) -> list[MapArtArchiveEntry]:
+    """Random but reproducible maps, every seventh message holds two maps"""
+    rng = random.Random(seed)
+    artists = [f"Artist{i}" for i in range(max(5, count // 20))]
+    start = datetime.datetime(2018, 1, 1, tzinfo=datetime.UTC)
+
+    return [
+        MapArtArchiveEntry(
+            width=rng.randint(1, 12),
+            height=rng.randint(1, 12),
+            map_type=rng.choice(list(MapArtType)),
+            palette=rng.choice(list(MapArtPalette)),
+            name=f"{" ".join(rng.sample(WORDS, 2))} {i}",
+            artists=rng.sample(artists, rng.randint(1, 3)),
+            notes=rng.choice(["", "colour suppressed", "big build"]),
+            image_url=rng.choice(["", "https://example.com/map.png"]),
+            create_date=start + datetime.timedelta(minutes=i * 37 + rng.randint(0, 30)),
+            author_id=rng.randint(1, 50),
+            message_id=10 ** 17 + i // (1 + (i % 7 == 0)),
+        )
+        for i in range(count)
+    ]
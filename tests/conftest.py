@@ -0,0 +1,40 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# config is read when it is imported, so the test database is set up before any module of the bot is imported
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "map_art.db")
+os.environ.setdefault("TOKEN", "test")
+os.environ.setdefault("BLACKLIST", "[]")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import sqla_db
+from archive_maps import make_maps
+
+ARCHIVE_SIZE = 1500
+
+
+@pytest.fixture(scope="session")
+def run():
+    """Runs a coroutine on the event loop shared by all tests, the connection pools of the database are bound to it"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+
+    loop.run_until_complete(sqla_db.Session.engine.dispose())
+    loop.run_until_complete(sqla_db.Session.reader_engine.dispose())
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def archive(run) -> int:
+    """Creates the schema and fills the archive, returns the number of maps"""
+    async def fill():
+        await sqla_db.create_schema()
+        async with sqla_db.Session() as db:
+            await db.add_maps(make_maps(ARCHIVE_SIZE))
+
+    run(fill())
+    return ARCHIVE_SIZE
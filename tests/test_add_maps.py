@@ -0,0 +1,55 @@
+import dataclasses
+
+import pytest
+from sqlalchemy import event, select
+
+import sqla_db
+from archive_maps import make_maps
+
+
+@pytest.fixture
+def map_statements():
+    """SQL of every statement run on the map table, executemany counts once"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO map_art "):
+            statements.append(statement)
+
+    event.listen(sqla_db.Session.engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(sqla_db.Session.engine.sync_engine, "before_cursor_execute", record)
+
+
+def test_maps_are_written_in_one_statement(run, archive, map_statements):
+    # message ids outside of the archive, so the new maps can be found again
+    maps = [dataclasses.replace(entry, message_id=i + 1) for i, entry in enumerate(make_maps(5, seed=6))]
+
+    async def stored_maps() -> list[sqla_db.MapArtArchiveEntry]:
+        async with sqla_db.Session(read_only=True) as db:
+            query = select(sqla_db.MapArtArchiveDBEntry.map_id).where(sqla_db.MapArtArchiveDBEntry.message_id <= len(maps))
+            map_ids = (await db.session.execute(query)).scalars().all()
+            return sorted(await db.get_maps(map_ids), key=lambda entry: entry.message_id)
+
+    async def add_maps(entries):
+        async with sqla_db.Session() as db:
+            await db.add_maps(entries)
+
+    async def delete_maps(entries):
+        async with sqla_db.Session() as db:
+            await db.delete_maps(entries)
+
+    run(add_maps(maps))
+    added = run(stored_maps())
+
+    assert len(map_statements) == 1
+    assert [(entry.name, entry.artists) for entry in added] == [(entry.name, entry.artists) for entry in maps]
+
+    map_statements.clear()
+    run(add_maps([dataclasses.replace(entry, name=f"renamed {entry.name}") for entry in added]))
+    updated = run(stored_maps())
+    run(delete_maps(updated))
+
+    assert len(map_statements) == 1
+    assert [entry.map_id for entry in updated] == [entry.map_id for entry in added]
+    assert [entry.name for entry in updated] == [f"renamed {entry.name}" for entry in maps]
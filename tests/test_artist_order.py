@@ -0,0 +1,58 @@
+import dataclasses
+
+import pytest
+from sqlalchemy import select
+
+import sqla_db
+from archive_maps import make_maps
+
+# the second artist gets the lower artist id, so the entered order differs from the id order
+ARTIST_ORDERS = [["Order Zed"], ["Order Bob", "Order Zed"], ["Order Amy", "Order Zed", "Order Bob"]]
+
+
+@pytest.fixture
+def ordered_maps(run, archive):
+    maps = [dataclasses.replace(entry, map_id=10 ** 6 + i, artists=artists)
+            for i, (entry, artists) in enumerate(zip(make_maps(3, seed=4), ARTIST_ORDERS))]
+
+    async def add_maps():
+        async with sqla_db.Session() as db:
+            await db.add_maps(maps)
+
+    async def delete_maps():
+        async with sqla_db.Session() as db:
+            await db.delete_maps(maps)
+
+    run(add_maps())
+    yield [entry.map_id for entry in maps]
+    run(delete_maps())
+
+
+def test_artist_positions_follow_entered_order(run, ordered_maps):
+    async def stored_positions():
+        async with sqla_db.Session(read_only=True) as db:
+            query = (select(sqla_db.artist_mapart.c.map_id, sqla_db.MapArtArtist.name, sqla_db.artist_mapart.c.position)
+                     .join(sqla_db.MapArtArtist)
+                     .where(sqla_db.artist_mapart.c.map_id.in_(ordered_maps)))
+            return {(map_id, name): position for map_id, name, position in await db.session.execute(query)}
+
+    assert run(stored_positions()) == {(map_id, name): position for map_id, artists in zip(ordered_maps, ARTIST_ORDERS)
+                                       for position, name in enumerate(artists)}
+
+
+def test_artists_keep_entered_order(run, ordered_maps):
+    async def stored_artists():
+        async with sqla_db.Session(read_only=True) as db:
+            query = select(sqla_db.MapArtArchiveDBEntry).where(sqla_db.MapArtArchiveDBEntry.map_id.in_(ordered_maps))
+            db_entries = {db_entry.map_id: db_entry for db_entry in (await db.session.execute(query)).scalars()}
+            return [[artist.name for artist in db_entries[map_id].artists] for map_id in ordered_maps]
+
+    assert run(stored_artists()) == ARTIST_ORDERS
+
+
+def test_entries_keep_entered_order(run, ordered_maps):
+    async def entry_artists():
+        async with sqla_db.Session(read_only=True) as db:
+            return [entry.artists for entry in await db.get_maps(ordered_maps)]
+
+    assert run(entry_artists()) == ARTIST_ORDERS
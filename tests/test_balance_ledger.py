@@ -0,0 +1,176 @@
+import asyncio
+import random
+
+import sqla_db
+from balance_ledger import BalanceLedger
+
+
+async def stored_balance(user_id: int) -> sqla_db.Balance:
+    async with sqla_db.Session(read_only=True) as db:
+        return await db.get_balance(user_id)
+
+
+def test_parallel_bets_never_overdraw(run, archive):
+    user_id = 1001
+
+    async def bet_all():
+        ledger = BalanceLedger(flush_interval=0.001, max_pending=5)
+        ledger.start()
+
+        # every bet is lost, the starting balance covers exactly 10 of them
+        results = await asyncio.gather(*(ledger.update_balance(user_id, False, 100, 0) for _ in range(50)))
+        await ledger.stop()
+
+        return results, await stored_balance(user_id)
+
+    results, balance = run(bet_all())
+
+    assert sum(result is not None for result in results) == sqla_db.STARTING_BALANCE // 100
+    assert balance.balance == 0
+    assert balance.total_bets == sqla_db.STARTING_BALANCE
+
+
+def test_parallel_bets_with_evicted_balances(run, archive, monkeypatch):
+    user_ids = list(range(2001, 2009))
+    rng = random.Random(10)
+
+    # slow reads let flushes write and evict balances while they are read
+    get_balance = sqla_db.Session.get_balance
+
+    async def slow_get_balance(self, user_id):
+        balance = await get_balance(self, user_id)
+        await asyncio.sleep(rng.random() * 0.01)
+        return balance
+
+    monkeypatch.setattr(sqla_db.Session, "get_balance", slow_get_balance)
+
+    async def bet_all():
+        ledger = BalanceLedger(flush_interval=0.001, max_pending=3, max_cached=2)
+        ledger.start()
+        expected = {user_id: (sqla_db.STARTING_BALANCE, 0) for user_id in user_ids}
+
+        async def gambler(user_id):
+            for _ in range(40):
+                bet = rng.randint(1, 400)
+                won = rng.random() < 0.3
+
+                balance = await ledger.update_balance(user_id, won, bet, bet * 3)
+                if balance is not None:
+                    amount, total_bets = expected[user_id]
+                    expected[user_id] = (amount + (bet * 2 if won else -bet), total_bets + bet)
+
+                    # a stale cached balance would allow bets the stored balance can't cover
+                    assert (balance.balance, balance.total_bets) == expected[user_id]
+                    assert balance.balance >= 0
+
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(gambler(user_id) for user_id in user_ids for _ in range(3)))
+        await ledger.stop()
+
+        return expected, {user_id: await stored_balance(user_id) for user_id in user_ids}
+
+    expected, stored = run(bet_all())
+
+    for user_id in user_ids:
+        assert (stored[user_id].balance, stored[user_id].total_bets) == expected[user_id]
+
+
+def test_balance_read_across_flush_is_not_cached(run, archive, monkeypatch):
+    user_id = 2501
+    read_started = asyncio.Event()
+    release_read = asyncio.Event()
+
+    # the first read is held back until another bet was written and evicted
+    get_balance = sqla_db.Session.get_balance
+
+    async def held_get_balance(self, balance_user_id):
+        balance = await get_balance(self, balance_user_id)
+        if not read_started.is_set():
+            read_started.set()
+            await release_read.wait()
+        return balance
+
+    monkeypatch.setattr(sqla_db.Session, "get_balance", held_get_balance)
+
+    async def read_across_flush():
+        ledger = BalanceLedger(flush_interval=1, max_pending=50, max_cached=0)
+
+        held_read = asyncio.create_task(ledger.get_balance(user_id))
+        await read_started.wait()
+
+        await ledger.update_balance(user_id, False, 100, 0)
+        await ledger.flush()
+        release_read.set()
+
+        return (await held_read).balance
+
+    assert run(read_across_flush()) == sqla_db.STARTING_BALANCE - 100
+
+
+def test_stored_balances_are_readable(run, archive):
+    user_id = 3001
+
+    async def read_balances():
+        async with sqla_db.Session() as db:
+            await db.apply_balance_changes({user_id: (50, 10)})
+
+        # balances read by a fresh ledger come from read only sessions
+        ledger = BalanceLedger(flush_interval=1, max_pending=50)
+        balance = await ledger.get_balance(user_id)
+        top_balances, top_bets = await ledger.get_leaderboard()
+
+        return balance, top_balances
+
+    balance, top_balances = run(read_balances())
+
+    assert (balance.balance, balance.total_bets) == (sqla_db.STARTING_BALANCE + 50, 10)
+    assert any(entry.discord_id == user_id for entry in top_balances)
+
+
+def test_additions_to_negative_balances(run, archive):
+    user_id = 3101
+
+    async def change_balances():
+        ledger = BalanceLedger(flush_interval=1, max_pending=50)
+
+        negative = (await ledger.add_balance(user_id, -1500)).balance
+        claimed = (await ledger.add_balance(user_id, 200)).balance
+        bet = await ledger.update_balance(user_id, False, 100, 0)
+
+        return negative, claimed, bet
+
+    assert run(change_balances()) == (sqla_db.STARTING_BALANCE - 1500, sqla_db.STARTING_BALANCE - 1300, None)
+
+
+def test_bets_during_reset_are_checked_against_it(run, archive, monkeypatch):
+    user_id = 3201
+    write_started = asyncio.Event()
+    release_write = asyncio.Event()
+
+    # the reset is held back until a bet was placed
+    reset_gambler = sqla_db.Session.reset_gambler
+
+    async def held_reset_gambler(self, reset_user_id):
+        write_started.set()
+        await release_write.wait()
+        return await reset_gambler(self, reset_user_id)
+
+    monkeypatch.setattr(sqla_db.Session, "reset_gambler", held_reset_gambler)
+
+    async def bet_during_reset():
+        ledger = BalanceLedger(flush_interval=1, max_pending=50)
+        await ledger.add_balance(user_id, 4000)
+
+        reset = asyncio.create_task(ledger.reset_gambler(user_id))
+        await write_started.wait()
+
+        bet = await ledger.update_balance(user_id, False, 3000, 0)
+        claimed = await ledger.add_balance(user_id, 200)
+        release_write.set()
+        await reset
+        await ledger.flush()
+
+        return bet, claimed.balance, (await stored_balance(user_id)).balance
+
+    assert run(bet_during_reset()) == (None, 200, 200)
@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import text
+
+import sqla_db
+from cogs.search import SearchArgumentConverter, build_query
+
+# search, index the plan has to use, whether the index also gives the order of the results
+SEARCH_SHAPES = [
+    ("", "ix_map_art_create_date", True),
+    ("-o:date", "ix_map_art_create_date", True),
+    ("o:size", "ix_map_art_area_create_date", True),
+    ("-o:size", "ix_map_art_area_create_date", True),
+    ("after:1600000000000000.500", "ix_map_art_create_date", True),
+    ("o:size before:40.1600000000000000.500", "ix_map_art_area_create_date", True),
+    ("size:>=40 o:size", "ix_map_art_area_create_date", True),
+    ("size:3x4", "ix_map_art_area_create_date", False),
+    ("--noimg", "ix_map_art_create_date", True),
+    ("t:flat", "ix_map_art_type", False),
+    ("pal:full", "ix_map_art_palette", False),
+    ("--dup", "ix_map_art_message_id", False),
+    ("a:artist3", "ix_artist_name_key", False),
+    ("100000000000000042", "ix_map_art_message_id", False),
+    ("miku", "map_art_fts VIRTUAL TABLE", False),
+]
+
+
+async def query_plan(search: str) -> list[str]:
+    """EXPLAIN QUERY PLAN of the page query of a search, as run by MapArtQueryBuilder.execute_ids"""
+    search_args = await SearchArgumentConverter().convert(None, search)
+
+    async with sqla_db.Session(read_only=True) as db:
+        query_builder = db.get_query_builder()
+        build_query(search_args, query_builder)
+
+        query = query_builder.query.with_only_columns(sqla_db.MapArtArchiveDBEntry.map_id).limit(10)
+        if query_builder.seek is not None:
+            query = query.where(query_builder.seek)
+
+        sql = query.compile(db.session.bind, compile_kwargs={"literal_binds": True})
+        return [row[3] for row in await db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+@pytest.mark.parametrize("search, index, ordered", SEARCH_SHAPES)
+def test_search_uses_index(run, archive, search, index, ordered):
+    plan = run(query_plan(search))
+
+    assert any(index in step for step in plan), plan
+    # the map table is never scanned without an index
+    assert not any(step.startswith("SCAN map_art ") and "INDEX" not in step for step in plan), plan
+    if ordered:
+        assert not any("TEMP B-TREE FOR ORDER BY" in step for step in plan), plan
@@ -0,0 +1,39 @@
+import random
+from collections import Counter
+
+from sqlalchemy import select
+
+import sqla_db
+
+PICKS_PER_MAP = 100
+
+
+async def pick_maps(picks: int) -> tuple[set[int], Counter]:
+    async with sqla_db.Session(read_only=True) as db:
+        map_ids = set((await db.session.execute(select(sqla_db.MapArtArchiveDBEntry.map_id))).scalars())
+        counts = Counter([await sqla_db.map_id_sampler.pick(db.session) for _ in range(picks)])
+
+    return map_ids, counts
+
+
+def test_random_maps_are_uniform(run, archive):
+    random.seed(8)
+    map_ids, counts = run(pick_maps(archive * PICKS_PER_MAP))
+
+    assert set(counts) <= map_ids
+
+    # chi-squared test over all maps, the limit is the 99.9th percentile for archive - 1 degrees of freedom
+    chi_squared = sum((counts[map_id] - PICKS_PER_MAP) ** 2 / PICKS_PER_MAP for map_id in map_ids)
+    degrees_of_freedom = len(map_ids) - 1
+    assert chi_squared < degrees_of_freedom + 3.09 * (2 * degrees_of_freedom) ** 0.5
+
+
+def test_random_map_is_loaded(run, archive):
+    async def random_map():
+        async with sqla_db.Session(read_only=True) as db:
+            return await db.get_map_count(), await db.get_random_map()
+
+    map_count, entry = run(random_map())
+
+    assert map_count == archive
+    assert entry is not None and entry.artists
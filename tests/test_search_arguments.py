@@ -0,0 +1,99 @@
+import random
+import re
+
+import pytest
+
+from cogs.search import MixedArgsConverter, SearchArgument
+
+
+def reference_convert(argument: str) -> list[SearchArgument]:
+    """The parser MixedArgsConverter replaced, trying one pattern per argument form on the rest of the input"""
+    arguments: list[SearchArgument] = []
+
+    argument = argument.lstrip()
+
+    while argument:
+        # keyword argument with quoted value, e.g. key: "value quoted"
+        if match := re.match(r"(?P<key>\S+)\s*:\s*\"(?P<value>([^\"\\]|\\.)*)\"", argument):
+            key = match.group("key")
+            value = re.sub(r"\\(.)", r"\1", match.group("value")).strip()
+            if value:
+                if exclude := key.startswith("-"):
+                    key = key[1:]
+
+                arguments.append(SearchArgument(exclude, key, value, match.group(0)))
+        # keyword argument with plain value, e.g. key: value
+        elif match := re.match(r"(?P<key>\S+)\s*:\s*(?P<value>\S+)", argument):
+            key = match.group("key")
+            value = match.group("value").strip()
+            if value:
+                if exclude := key.startswith("-"):
+                    key = key[1:]
+
+                arguments.append(SearchArgument(exclude, key, value, match.group(0)))
+        # argument with quoted value, e.g. "value quoted"
+        elif match := re.match(r"-?\"(?P<value>([^\"\\]|\\.)*)\"", argument):
+            value = re.sub(r"\\(.)", r"\1", match.group("value")).strip()
+            if value:
+                exclude = match.group(0).startswith("-")
+
+                arguments.append(SearchArgument(exclude, None, value, match.group(0)))
+        # argument with plain value, e.g. value
+        elif match := re.match(r"-?(?P<value>\S+)", argument):
+            value = match.group("value").strip()
+            exclude = match.group(0).startswith("-")
+
+            if value:
+                arguments.append(SearchArgument(exclude, None, value, match.group(0)))
+        else:
+            raise ValueError(f"cannot continue parsing `{argument}`")
+
+        argument = argument[match.end():].lstrip()
+
+    return arguments
+
+
+# letters, the syntax characters and ASCII / unicode whitespace, including characters only \s treats as whitespace
+ALPHABET = [*"ab:-\"\\ \t\n'", "　", "\x1c", "\x85", "t", "pal", "é"]
+
+EXAMPLES = [
+    "",
+    "   ",
+    'a:"b c" -t:flat "quoted value" -"excluded value" word -word',
+    'artist : "Some One" pal:full',
+    'a:"unterminated',
+    '"escaped \\" quote" a:"back\\\\slash"',
+    "key:",
+    ": value",
+    "-",
+    '""',
+    'a:"  "',
+]
+
+
+def random_argument(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 24)))
+
+
+def parse(parser, argument: str):
+    """Arguments or the type of the raised exception, converter errors are compared by type only"""
+    try:
+        return parser(argument)
+    except Exception as error:
+        return type(error)
+
+
+@pytest.mark.parametrize("argument", EXAMPLES)
+def test_examples_match_reference(run, argument):
+    assert parse(lambda value: run(MixedArgsConverter().convert(None, value)), argument) \
+        == parse(reference_convert, argument)
+
+
+def test_random_arguments_match_reference(run):
+    rng = random.Random(19)
+    converter = MixedArgsConverter()
+
+    for _ in range(5000):
+        argument = random_argument(rng)
+        assert parse(lambda value: run(converter.convert(None, value)), argument) \
+            == parse(reference_convert, argument), repr(argument)
@@ -0,0 +1,44 @@
+import pytest
+
+import sqla_db
+from cogs import search
+from cogs.search import SearchArgumentConverter
+
+
+@pytest.fixture
+def search_cache(monkeypatch):
+    cache = search.SearchCache(max_size=16, ttl=600)
+    monkeypatch.setattr(search, "search_cache", cache)
+    return cache
+
+
+async def search_args(argument: str) -> search.SearchArguments:
+    return await SearchArgumentConverter(default_min_size=0, default_order_by="date").convert(None, argument)
+
+
+async def matching_ids(argument: str) -> list[int]:
+    async with sqla_db.Session(read_only=True) as db:
+        return await search.get_query_builder(db, await search_args(argument)).execute_ids()
+
+
+def test_counts_are_not_cached(run, archive, search_cache):
+    assert run(search.search_count(run(search_args("a:artist3")))) == len(run(matching_ids("a:artist3")))
+    assert len(search_cache.entries) == 0
+
+
+def test_odds_cache_small_searches_only(run, archive, search_cache):
+    small_count = run(search.search_count(run(search_args("a:artist3")), fill_cache=True))
+    broad_count = run(search.search_count(run(search_args("")), fill_cache=True))
+
+    assert small_count == len(run(matching_ids("a:artist3")))
+    assert broad_count == archive > search.CACHE_FILL_LIMIT
+    assert [list(map_ids) for _, _, map_ids in search_cache.entries.values()] == [run(matching_ids("a:artist3"))]
+
+
+@pytest.mark.parametrize("argument", ["a:artist3", "", "miku -castle", "t:flat pal:full"])
+def test_gamble_count_and_match(run, archive, search_cache, argument):
+    map_ids = run(matching_ids(argument))
+    others = sorted(set(range(1, archive + 1)) - set(map_ids))
+
+    for map_id in [*map_ids[:3], *others[:3]]:
+        assert run(search.search_count_and_match(run(search_args(argument)), map_id)) == (len(map_ids), map_id in map_ids)